@@ -5,41 +5,127 @@ Automatically adjusts levels so dialogue is clear.
 """
 
 import subprocess
-import tempfile
+import platform
+import os
+import threading
+from functools import lru_cache
 from pathlib import Path
 import argparse
 
+try:
+    import av  # PyAV: reads container headers in-process
+except ImportError:
+    av = None
 
-def download_audio(url: str, output_path: str) -> bool:
-    """Download audio from URL using yt-dlp."""
-    print(f"📥 Downloading audio from: {url}")
+
+def _probe_encoders() -> frozenset:
+    """Return the names of all encoders the local ffmpeg build supports."""
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True, text=True
+        )
+    except OSError:
+        return frozenset()
+    
+    names = set()
+    for line in result.stdout.splitlines():
+        # Encoder rows look like: " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+# Probed once at import so every ffmpeg call can pick the fastest encoder
+AVAILABLE_ENCODERS = _probe_encoders()
+
+if platform.system() == 'Darwin' and 'h264_videotoolbox' in AVAILABLE_ENCODERS:
+    HW_VIDEO_ENCODER = 'h264_videotoolbox'  # Apple media engine
+elif 'h264_nvenc' in AVAILABLE_ENCODERS:
+    HW_VIDEO_ENCODER = 'h264_nvenc'  # NVIDIA NVENC
+else:
+    HW_VIDEO_ENCODER = None
+
+# AAC encoder args: AudioToolbox (hardware) on macOS, Fraunhofer FDK if the
+# build has it, otherwise ffmpeg's built-in encoder
+if platform.system() == 'Darwin' and 'aac_at' in AVAILABLE_ENCODERS:
+    AUDIO_ENCODER_ARGS = ['-c:a', 'aac_at', '-aac_at_mode', 'cvbr', '-b:a', '192k']
+elif 'libfdk_aac' in AVAILABLE_ENCODERS:
+    AUDIO_ENCODER_ARGS = ['-c:a', 'libfdk_aac', '-b:a', '192k']
+else:
+    AUDIO_ENCODER_ARGS = ['-c:a', 'aac', '-b:a', '192k']
+
+
+def video_encoder_args(encoder: str = "copy") -> tuple:
+    """
+    Build ffmpeg arguments for the requested video encoder.
+    
+    Args:
+        encoder: 'copy' (no re-encode), 'auto' (hardware encoder if available,
+                 else libx264) or any ffmpeg encoder name
+    
+    Returns:
+        (input_args, output_args) - input_args go before the video '-i'
+    """
+    if encoder == "copy":
+        return [], ['-c:v', 'copy']
+    
+    if encoder == "auto":
+        encoder = HW_VIDEO_ENCODER or 'libx264'
+    
+    input_args = []
+    if encoder.endswith('_nvenc'):
+        # Decode on the GPU too so frames never leave video memory
+        input_args = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+    elif encoder.endswith('_videotoolbox'):
+        input_args = ['-hwaccel', 'videotoolbox']
+    
+    return input_args, ['-c:v', encoder]
+
+
+def stream_audio(url: str, concurrent_fragments: int = 8) -> subprocess.Popen:
+    """
+    Start yt-dlp streaming the best audio track of URL to its stdout.
+    
+    The caller feeds the pipe straight into ffmpeg, so downloading and
+    mixing overlap and no temporary audio file is written.
+    HLS/DASH sources are split into fragments; fetching several at once is
+    usually much faster than the default single connection.
+    """
+    print(f"📥 Streaming audio from: {url}")
     
     cmd = [
         'yt-dlp',
-        '-x',  # Extract audio
-        '--audio-format', 'mp3',
-        '--audio-quality', '0',  # Best quality
-        '-o', output_path,
+        '-f', 'bestaudio/best',  # Audio-only stream when available
+        '--concurrent-fragments', str(concurrent_fragments),  # Parallel fragment downloads
+        '--http-chunk-size', '10M',  # Chunked requests for non-fragmented sources
+        '--no-progress',  # We print our own status
+        '--quiet',
+        '-o', '-',  # Write to stdout
         url
     ]
     
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print("✅ Audio downloaded successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error downloading audio: {e.stderr}")
-        return False
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
 
-def get_video_duration(video_path: str) -> float:
-    """Get video duration in seconds."""
+@lru_cache(maxsize=1024)
+def _probe_duration(video_path: str, mtime_ns: int, size: int) -> float:
+    """Read a container's duration; mtime/size are part of the cache key."""
+    if av is not None:
+        try:
+            with av.open(video_path) as container:
+                if container.duration is not None:
+                    return float(container.duration) / av.time_base
+        except Exception:
+            pass  # Container PyAV can't read, fall back to ffprobe below
+    
     cmd = [
         'ffprobe',
         '-v', 'error',
         '-show_entries', 'format=duration',
         '-of', 'default=noprint_wrappers=1:nokey=1',
-        str(video_path)
+        video_path
     ]
     result = subprocess.run(cmd, capture_output=True, text=True)
     try:
@@ -48,6 +134,58 @@ def get_video_duration(video_path: str) -> float:
         return 0.0
 
 
+def get_video_duration(video_path: str) -> float:
+    """Get video duration in seconds (PyAV when installed, else ffprobe)."""
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return 0.0
+    return _probe_duration(str(video_path), stat.st_mtime_ns, stat.st_size)
+
+
+def run_ffmpeg(cmd: list, total_seconds: float, stdin=None) -> tuple:
+    """
+    Run an ffmpeg command while printing its progress.
+    
+    ffmpeg reports progress as key=value lines on stdout (-progress pipe:1),
+    parsed on a background thread; stderr only carries errors since the
+    commands run with -loglevel error, so nothing large is buffered.
+    
+    Args:
+        cmd: ffmpeg command (first element is the ffmpeg binary)
+        total_seconds: Expected output duration, for the percentage
+        stdin: Optional pipe from an upstream process; the parent's copy is
+               closed once ffmpeg has started so the upstream sees SIGPIPE
+    
+    Returns:
+        (returncode, stderr_text)
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    proc = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if stdin is not None:
+        stdin.close()
+    
+    def report_progress():
+        for line in iter(proc.stdout.readline, b''):
+            # out_time_ms is in microseconds despite its name
+            if line.startswith(b'out_time_ms=') and total_seconds > 0:
+                try:
+                    seconds = int(line.split(b'=', 1)[1]) / 1_000_000
+                except ValueError:
+                    continue  # "N/A" before the first frame
+                percent = min(100.0, seconds / total_seconds * 100)
+                print(f"\r   ⏳ {percent:5.1f}%", end="", flush=True)
+    
+    progress_thread = threading.Thread(target=report_progress, daemon=True)
+    progress_thread.start()
+    stderr = proc.stderr.read()
+    proc.wait()
+    progress_thread.join()
+    print()
+    
+    return proc.returncode, stderr.decode(errors='replace')
+
+
 def add_background_music(
     video_path: str,
     music_url: str,
@@ -56,7 +194,8 @@ def add_background_music(
     dialogue_volume: float = 1.0,
     fade_in: float = 2.0,
     fade_out: float = 3.0,
-    loop_music: bool = True
+    loop_music: bool = True,
+    encoder: str = "copy",
 ):
     """
     Add background music to video with smart mixing.
@@ -70,6 +209,7 @@ def add_background_music(
         fade_in: Fade in duration in seconds
         fade_out: Fade out duration in seconds
         loop_music: Loop music to match video duration
+        encoder: Video encoder - 'copy' (default), 'auto' for hardware, or an ffmpeg encoder name
     """
     
     print("\n🎵 Adding Background Music to Video")
@@ -85,15 +225,9 @@ def add_background_music(
         print(f"❌ Video file not found: {video_path}")
         return False
     
-    # Create temp directory
-    temp_dir = Path(tempfile.mkdtemp())
-    temp_audio = temp_dir / "background_music.mp3"
+    downloader = None
     
     try:
-        # Download music
-        if not download_audio(music_url, str(temp_audio)):
-            return False
-        
         # Get video duration
         video_duration = get_video_duration(video_path)
         print(f"📊 Video duration: {video_duration:.2f} seconds")
@@ -109,6 +243,8 @@ def add_background_music(
         ]
         
         if loop_music:
+            # The music arrives on a pipe, which -stream_loop can't rewind,
+            # so looping has to happen in the filter graph here
             music_filters.insert(0, f"aloop=loop=-1:size=2e+09")  # Loop infinitely
         
         music_filter = ",".join(music_filters)
@@ -116,30 +252,44 @@ def add_background_music(
         # Dialogue filter
         dialogue_filter = f"volume={dialogue_volume}"
         
+        video_input_args, video_output_args = video_encoder_args(encoder)
+        
         # FFmpeg command with advanced audio mixing
         cmd = [
             'ffmpeg',
+            '-hide_banner', '-loglevel', 'error',  # Only errors on stderr
+            *video_input_args,  # Hardware decode (only when re-encoding video)
             '-i', str(video_path),  # Input video
-            '-i', str(temp_audio),  # Input music
+            '-i', 'pipe:0',  # Input music (streamed from yt-dlp)
             '-filter_complex',
             f"[1:a]{music_filter}[music];"  # Process music
             f"[0:a]{dialogue_filter}[dialogue];"  # Process dialogue
             f"[dialogue][music]amix=inputs=2:duration=first:dropout_transition=0[aout]",  # Mix both (dialogue first to prioritize)
             '-map', '0:v',  # Use video from input 0
             '-map', '[aout]',  # Use mixed audio
-            '-c:v', 'copy',  # Copy video (no re-encoding)
-            '-c:a', 'aac',  # Encode audio as AAC
-            '-b:a', '192k',  # Audio bitrate
+            *video_output_args,  # Copy video unless an encoder was requested
+            *AUDIO_ENCODER_ARGS,  # AAC at 192k (hardware on macOS)
             '-shortest',  # Stop when shortest input ends
             '-y',
             str(output_path)
         ]
         
+        # Download and mix concurrently: yt-dlp stdout -> ffmpeg stdin
+        downloader = stream_audio(music_url)
         print("🎬 Processing video... (this may take a few minutes)")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, ffmpeg_err = run_ffmpeg(cmd, video_duration, stdin=downloader.stdout)
         
-        if result.returncode != 0:
-            print(f"❌ Error: {result.stderr}")
+        # -shortest can end the mix before the download finishes, so yt-dlp's
+        # exit status only matters when ffmpeg itself failed. Even then, a
+        # yt-dlp still running or failing on the closed pipe (EPIPE) means
+        # ffmpeg died first; only a download that failed on its own is blamed
+        if returncode != 0:
+            if downloader.poll() not in (None, 0):
+                download_err = downloader.stderr.read().decode(errors='replace')
+                if 'broken pipe' not in download_err.lower():
+                    print(f"❌ Error downloading audio: {download_err}")
+                    return False
+            print(f"❌ Error: {ffmpeg_err}")
             return False
         
         print(f"\n✅ Success! Video with music saved to: {output_path}")
@@ -151,11 +301,10 @@ def add_background_music(
         return False
     
     finally:
-        # Cleanup temp files
-        if temp_audio.exists():
-            temp_audio.unlink()
-        if temp_dir.exists():
-            temp_dir.rmdir()
+        # Don't leave yt-dlp running if mixing failed part-way
+        if downloader is not None and downloader.poll() is None:
+            downloader.kill()
+            downloader.wait()
 
 
 def add_background_music_simple(
@@ -192,31 +341,32 @@ def add_background_music_simple(
     
     cmd = [
         'ffmpeg',
+        '-hide_banner', '-loglevel', 'error',
         '-i', str(video_path),
+        '-stream_loop', '-1',  # Loop music at the demuxer (no filter buffering)
         '-i', str(music_path),
         '-filter_complex',
-        f"[1:a]aloop=loop=-1:size=2e+09,volume={music_volume},"
+        f"[1:a]volume={music_volume},"
         f"afade=t=in:st=0:d=2,afade=t=out:st={video_duration-3}:d=3[music];"
         f"[0:a]volume=1.0[dialogue];"
         f"[dialogue][music]amix=inputs=2:duration=first:dropout_transition=0[aout]",
         '-map', '0:v',
         '-map', '[aout]',
         '-c:v', 'copy',
-        '-c:a', 'aac',
-        '-b:a', '192k',
+        *AUDIO_ENCODER_ARGS,
         '-shortest',
         '-y',
         str(output_path)
     ]
     
     print("🎬 Processing...")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    returncode, ffmpeg_err = run_ffmpeg(cmd, video_duration)
     
-    if result.returncode == 0:
+    if returncode == 0:
         print(f"✅ Success! Video saved to: {output_path}")
         return True
     else:
-        print(f"❌ Error: {result.stderr}")
+        print(f"❌ Error: {ffmpeg_err}")
         return False
 
 
@@ -256,6 +406,8 @@ Examples:
                         help='Fade out duration in seconds (default: 3.0)')
     parser.add_argument('--no-loop', action='store_true',
                         help='Don\'t loop music to match video duration')
+    parser.add_argument('--encoder', default='copy',
+                        help="Video encoder: 'copy', 'auto' (hardware) or an ffmpeg encoder name (default: copy)")
     
     args = parser.parse_args()
     
@@ -277,7 +429,8 @@ Examples:
             args.dialogue_volume,
             args.fade_in,
             args.fade_out,
-            not args.no_loop
+            not args.no_loop,
+            args.encoder
         )
     
     exit(0 if success else 1)
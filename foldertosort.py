@@ -9,18 +9,52 @@ from transcribe_anything import transcribe
 from pathlib import Path
 import shutil
 import json
+import hashlib
+import os
+import platform
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from difflib import SequenceMatcher
 import re
 
+from video_utils import clean_text
+
+# Serializes status output from the parallel transcription workers
+_print_lock = threading.Lock()
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Fall back to difflib's pure-Python matcher
+    fuzz = process = None
+
+try:
+    import orjson  # SIMD JSON parser for large word-timestamp outputs
+except ImportError:
+    orjson = None
+
+try:
+    import mlx_whisper  # In-process Whisper: model stays loaded between files
+except ImportError:
+    mlx_whisper = None
+
+# One file at a time on the GPU; the loaded model is shared between threads
+_mlx_lock = threading.Lock()
+
 
 def run_mac_transcription(
     source: str,
     output_dir: str = "output",
     model: str = "large-v3",
     batch_size: int = 12,
+    prompt: str | None = None,
 ):
     """Transcribe a video file using Apple MLX."""
-    print(f"🎧 Transcribing: {Path(source).name}")
+    with _print_lock:
+        print(f"🎧 Transcribing: {Path(source).name}")
+    
+    if mlx_whisper is not None:
+        return transcribe_in_process(source, output_dir, model, prompt)
     
     output_path = transcribe(
         url_or_file=source,
@@ -28,11 +62,199 @@ def run_mac_transcription(
         model=model,
         device="mlx",
         other_args=["--batch_size", str(batch_size)],
+        initial_prompt=prompt,
     )
     
     return output_path
 
 
+def transcribe_in_process(source: str, output_dir: str, model: str, prompt: str | None = None) -> str:
+    """
+    Transcribe a local file with mlx_whisper inside this Python process.
+    
+    mlx_whisper keeps the last loaded model in memory, so a batch of files
+    loads the weights once instead of once per file as the
+    transcribe-anything CLI does. Writes out.txt and out.json like
+    transcribe-anything so the rest of the pipeline is unchanged.
+    """
+    # Audio decode (an ffmpeg subprocess) can overlap another file's inference
+    audio = mlx_whisper.audio.load_audio(source)
+    
+    with _mlx_lock:
+        result = mlx_whisper.transcribe(
+            audio,
+            path_or_hf_repo=f"mlx-community/whisper-{model}-mlx",
+            initial_prompt=prompt,
+        )
+    
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    (output_path / "out.txt").write_text(result["text"].strip())
+    (output_path / "out.json").write_text(json.dumps(result, ensure_ascii=False))
+    return str(output_path)
+
+
+def find_media_files(folder: Path, extensions: tuple) -> list:
+    """List files in folder whose extension (case-insensitive) is in extensions."""
+    wanted = frozenset(ext.lstrip('.').lower() for ext in extensions)
+    # scandir reuses the directory listing's file type, so no stat per entry
+    with os.scandir(folder) as entries:
+        return [
+            Path(entry.path) for entry in entries
+            if entry.name.rpartition('.')[2].lower() in wanted and entry.is_file()
+        ]
+
+
+# Linux FICLONE ioctl: share extents between files (Btrfs, XFS, bcachefs)
+_FICLONE = 0x40049409
+
+
+def fast_copy(src: Path, dst: Path):
+    """
+    Copy a file as a copy-on-write clone when the filesystem supports it.
+    
+    APFS (clonefile) and Btrfs/XFS (FICLONE) clones only write metadata, so
+    even multi-GB clips copy instantly. Falls back to shutil.copy2 anywhere
+    else, e.g. across volumes or on HFS+/ext4.
+    """
+    if platform.system() == 'Darwin':
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if dst.exists():
+            dst.unlink()  # clonefile refuses to overwrite
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+            shutil.copystat(src, dst)
+            return
+    else:
+        try:
+            import fcntl
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            shutil.copystat(src, dst)
+            return
+        except (ImportError, OSError):
+            pass
+    
+    shutil.copy2(src, dst)
+
+
+# Marker written once a transcription finished; holds its cache key
+DONE_MARKER = ".done"
+_CACHE_SAMPLE_BYTES = 1 << 20
+
+
+def transcription_cache_key(video_file: Path, model: str, batch_size: int, prompt: str | None = None) -> str:
+    """
+    Identify a clip's transcription by content rather than file name.
+    Hashes the size plus the first and last 1 MB of the file, so renamed or
+    copied clips hit the cache, and includes the transcription settings so a
+    model or prompt change re-transcribes.
+    """
+    size = video_file.stat().st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_file, 'rb') as f:
+        digest.update(f.read(_CACHE_SAMPLE_BYTES))
+        f.seek(max(size - _CACHE_SAMPLE_BYTES, 0))
+        digest.update(f.read())
+    key = f"{digest.hexdigest()}-{model}-{batch_size}"
+    if prompt:
+        key += "-" + hashlib.blake2b(prompt.encode(), digest_size=4).hexdigest()
+    return key
+
+
+def script_vocabulary_prompt(script_lines: list, max_chars: int = 800) -> str:
+    """
+    Build a Whisper prompt from the script's distinct words, in script order.
+    
+    Whisper conditions its decoding on the prompt, so names and unusual
+    words from the script come out spelled the way the matcher expects.
+    Only the vocabulary is passed, not whole lines, so the model has no
+    sentences to copy into silent stretches.
+    """
+    words = dict.fromkeys(
+        word for line in script_lines for word in re.findall(r"[\w'’]+", line)
+    )
+    prompt = " ".join(words)
+    if len(prompt) > max_chars:
+        # Cut at the last whole word that fits
+        prompt = prompt[:max_chars + 1].rsplit(" ", 1)[0]
+    return prompt
+
+
+def load_cache_index(transcription_folder: Path) -> dict:
+    """Map cache key -> transcription directory for every finished transcription."""
+    index = {}
+    for marker in transcription_folder.glob(f"*/{DONE_MARKER}"):
+        index[marker.read_text().strip()] = marker.parent
+    return index
+
+
+# Transcriptions running right now: {cache key: Future of the output directory}
+_in_flight = {}
+_cache_lock = threading.Lock()
+
+
+def load_or_transcribe(
+    video_file: Path,
+    transcription_folder: Path,
+    model: str,
+    batch_size: int,
+    cache_index: dict,
+    prompt: str | None = None,
+) -> tuple:
+    """
+    Transcribe a video unless an identical clip was already transcribed.
+    
+    Output stays in transcription_folder/<video stem>/ (the splicers and UI
+    look there); a directory without a matching .done marker is treated as
+    partial or stale and transcribed again. A duplicate of a clip that is
+    still being transcribed in this run waits for it and copies its outputs;
+    finished transcriptions are added to cache_index.
+    Returns (transcription_text, used_existing)
+    """
+    trans_output_dir = transcription_folder / video_file.stem
+    cache_key = transcription_cache_key(video_file, model, batch_size, prompt)
+    
+    owned = None
+    with _cache_lock:
+        cached_dir = cache_index.get(cache_key)
+        pending = _in_flight.get(cache_key) if cached_dir is None else None
+        if cached_dir is None and pending is None:
+            owned = _in_flight[cache_key] = Future()
+    
+    if pending is not None:
+        cached_dir = pending.result()  # Raises if the first copy failed
+    
+    if owned is not None:
+        try:
+            run_mac_transcription(
+                source=str(video_file),
+                output_dir=str(trans_output_dir),
+                model=model,
+                batch_size=batch_size,
+                prompt=prompt,
+            )
+            (trans_output_dir / DONE_MARKER).write_text(cache_key)
+        except BaseException as e:
+            with _cache_lock:
+                del _in_flight[cache_key]
+            owned.set_exception(e)
+            raise
+        with _cache_lock:
+            cache_index[cache_key] = trans_output_dir
+            del _in_flight[cache_key]
+        owned.set_result(trans_output_dir)
+    elif cached_dir != trans_output_dir:
+        # Same clip under another name: reuse its outputs
+        trans_output_dir.mkdir(exist_ok=True)
+        for output_file in cached_dir.glob("out.*"):
+            shutil.copy2(output_file, trans_output_dir / output_file.name)
+        (trans_output_dir / DONE_MARKER).write_text(cache_key)
+    
+    return get_transcription_text(str(trans_output_dir)), owned is None
+
+
 def get_transcription_text(output_dir: str) -> str:
     """Extract text from transcription output."""
     # Try to read the .txt file first
@@ -43,7 +265,8 @@ def get_transcription_text(output_dir: str) -> str:
     # Fallback to JSON if txt doesn't exist
     json_file = Path(output_dir) / "out.json"
     if json_file.exists():
-        data = json.loads(json_file.read_text())
+        raw = json_file.read_bytes()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
         if isinstance(data, dict) and "text" in data:
             return data["text"]
         elif isinstance(data, list):
@@ -52,15 +275,6 @@ def get_transcription_text(output_dir: str) -> str:
     return ""
 
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text for matching."""
-    # Convert to lowercase, remove extra whitespace
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-    return text.strip()
-
-
 def calculate_similarity(text1: str, text2: str) -> float:
     """Calculate similarity between two text strings."""
     clean1 = clean_text(text1)
@@ -72,37 +286,88 @@ def calculate_similarity(text1: str, text2: str) -> float:
     return SequenceMatcher(None, clean1, clean2).ratio()
 
 
-def find_best_video_for_line(script_line: str, video_transcriptions: dict) -> tuple:
+def chunked_ratio(line_clean: str, trans_clean: str, window: int = 500, step: int = 400) -> float:
+    """
+    Best SequenceMatcher ratio of a script line against overlapping transcript windows.
+    
+    Comparing against 500-character windows (100 characters of overlap)
+    keeps each comparison small, so total work grows linearly with the
+    transcript. The cheap quick_ratio upper bounds skip windows that can't
+    beat the best score so far.
+    """
+    matcher = SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(line_clean)  # seq2's index is built once and reused per window
+    
+    best = 0.0
+    for start in range(0, max(len(trans_clean) - (window - step), 1), step):
+        matcher.set_seq1(trans_clean[start:start + window])
+        if matcher.real_quick_ratio() <= best or matcher.quick_ratio() <= best:
+            continue
+        best = max(best, matcher.ratio())
+    return best
+
+
+@lru_cache(maxsize=None)
+def phrase_index(trans_clean: str, max_words: int = 10) -> frozenset:
+    """
+    Every 3 to max_words word phrase in a cleaned transcription.
+    Built once per transcription, so checking a script-line window against
+    it is a hash lookup rather than a scan of the whole transcript.
+    """
+    words = trans_clean.split()
+    return frozenset(
+        ' '.join(words[i:i + n])
+        for n in range(3, max_words + 1)
+        for i in range(len(words) - n + 1)
+    )
+
+
+def find_best_video_for_line(script_line: str, clean_transcriptions: dict) -> tuple:
     """
     Find which video best matches a specific line from the script.
+    
+    clean_transcriptions maps video name -> clean_text(transcription) and is
+    built once by the caller rather than per script line.
     Returns (video_name, best_score, matched_portion)
     """
-    best_video = None
-    best_score = 0.0
-    best_match = ""
-    
     script_line_clean = clean_text(script_line)
     if not script_line_clean:
         return (None, 0.0, "")
     
-    for video_name, transcription in video_transcriptions.items():
-        trans_clean = clean_text(transcription)
-        
-        # Try exact line match first
+    # Try exact line match first
+    for video_name, trans_clean in clean_transcriptions.items():
         if script_line_clean in trans_clean:
             return (video_name, 1.0, script_line)
+    
+    if process is not None:
+        # partial_ratio scores the best substring alignment, so it already
+        # covers the "phrase appears somewhere in the transcript" case
+        best = process.extractOne(script_line_clean, clean_transcriptions, scorer=fuzz.partial_ratio)
+        if best is None:
+            return (None, 0.0, "")
         
+        _, score, best_video = best
+        alignment = fuzz.partial_ratio_alignment(script_line_clean, clean_transcriptions[best_video])
+        best_match = clean_transcriptions[best_video][alignment.dest_start:alignment.dest_end]
+        return (best_video, score / 100.0, best_match)
+    
+    best_video = None
+    best_score = 0.0
+    best_match = ""
+    
+    for video_name, trans_clean in clean_transcriptions.items():
         # Calculate overall similarity
-        score = SequenceMatcher(None, script_line_clean, trans_clean).ratio()
+        score = chunked_ratio(script_line_clean, trans_clean)
         
         # Also check if any substantial portion of the line appears
         line_words = script_line_clean.split()
         if len(line_words) >= 3:
+            transcript_phrases = phrase_index(trans_clean)
             # Check for phrase matches (sliding window)
             for window_size in range(min(len(line_words), 10), 2, -1):
                 for i in range(len(line_words) - window_size + 1):
                     phrase = ' '.join(line_words[i:i + window_size])
-                    if phrase in trans_clean:
+                    if phrase in transcript_phrases:
                         # Boost score for partial matches
                         phrase_score = 0.5 + (window_size / len(line_words)) * 0.5
                         if phrase_score > score:
@@ -113,11 +378,44 @@ def find_best_video_for_line(script_line: str, video_transcriptions: dict) -> tu
             best_score = score
             best_video = video_name
             if not best_match:
-                best_match = transcription[:100]
+                best_match = trans_clean[:100]
     
     return (best_video, best_score, best_match)
 
 
+def embedding_similarity(script_lines: list, clean_transcriptions: dict, chunk_words: int = 200):
+    """
+    Score every script line against every transcription with sentence embeddings.
+    
+    Each transcription is split into ~chunk_words word chunks; a video's score
+    is its best chunk. All scores come from one matrix multiply of normalized
+    embeddings, so this is cosine similarity and catches paraphrased lines.
+    
+    Returns a (lines x videos) numpy array, columns in clean_transcriptions order.
+    Requires sentence-transformers (raises ImportError otherwise).
+    """
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    
+    chunks, owners = [], []
+    for video_index, trans_clean in enumerate(clean_transcriptions.values()):
+        words = trans_clean.split()
+        for start in range(0, max(len(words), 1), chunk_words):
+            chunks.append(' '.join(words[start:start + chunk_words]))
+            owners.append(video_index)
+    
+    line_vecs = model.encode([clean_text(line) for line in script_lines], normalize_embeddings=True)
+    chunk_vecs = model.encode(chunks, normalize_embeddings=True)
+    chunk_scores = line_vecs @ chunk_vecs.T  # (lines x chunks)
+    
+    # Max-pool chunk scores into their video's column
+    video_scores = np.full((len(clean_transcriptions), len(script_lines)), -1.0, dtype=np.float32)
+    np.maximum.at(video_scores, np.asarray(owners), chunk_scores.T)
+    return video_scores.T
+
+
 def transcribe_and_match_videos(
     video_folder: str,
     master_script_file: str,
@@ -126,6 +424,9 @@ def transcribe_and_match_videos(
     model: str = "large-v3",
     batch_size: int = 12,
     min_confidence: float = 0.3,
+    max_workers: int | None = None,
+    use_embeddings: bool = False,
+    script_prompt: bool = False,
 ):
     """
     Main function: Transcribe videos, match line-by-line to script, and organize them.
@@ -138,6 +439,11 @@ def transcribe_and_match_videos(
         model: Whisper model to use
         batch_size: Batch size for transcription
         min_confidence: Minimum matching confidence (0-1)
+        max_workers: Videos transcribed concurrently (default: half the CPU cores)
+        use_embeddings: Match with sentence embeddings instead of fuzzy text
+                        matching (needs sentence-transformers)
+        script_prompt: Prime Whisper with the script's vocabulary, so names and
+                       unusual words are spelled the way the script has them
     """
     video_folder_path = Path(video_folder)
     output_folder_path = Path(output_folder)
@@ -155,7 +461,7 @@ def transcribe_and_match_videos(
     
     # Find all video files
     video_extensions = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
-    video_files = [f for f in video_folder_path.iterdir() if f.suffix.lower() in video_extensions]
+    video_files = find_media_files(video_folder_path, video_extensions)
     
     if not video_files:
         print(f"❌ No video files found in {video_folder}")
@@ -167,37 +473,44 @@ def transcribe_and_match_videos(
     # Step 1: Transcribe all videos and store transcriptions
     video_transcriptions = {}  # {video_file: transcription_text}
     
-    for i, video_file in enumerate(video_files, 1):
-        print(f"\n🎬 [{i}/{len(video_files)}] Transcribing: {video_file.name}")
-        print("-" * 70)
-        
-        trans_output_dir = transcription_folder_path / video_file.stem
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 2) // 2)
+    
+    cache_index = load_cache_index(transcription_folder_path)
+    prompt = script_vocabulary_prompt(script_lines) if script_prompt else None
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                load_or_transcribe, video_file, transcription_folder_path, model, batch_size, cache_index, prompt
+            ): video_file
+            for video_file in video_files
+        }
         
-        try:
-            # Check if already transcribed
-            if trans_output_dir.exists():
-                print(f"   ⏩ Using existing transcription")
-                trans_text = get_transcription_text(str(trans_output_dir))
-            else:
-                # Transcribe video
-                run_mac_transcription(
-                    source=str(video_file),
-                    output_dir=str(trans_output_dir),
-                    model=model,
-                    batch_size=batch_size,
-                )
-                trans_text = get_transcription_text(str(trans_output_dir))
-            
-            if not trans_text:
-                print(f"⚠️  Warning: No transcription text found for {video_file.name}")
-                continue
-            
-            video_transcriptions[video_file] = trans_text
-            print(f"   ✅ Transcribed: {trans_text[:80]}...")
+        for i, future in enumerate(as_completed(futures), 1):
+            video_file = futures[future]
+            with _print_lock:
+                print(f"\n🎬 [{i}/{len(video_files)}] {video_file.name}")
+                print("-" * 70)
                 
-        except Exception as e:
-            print(f"❌ Error processing {video_file.name}: {e}")
-            continue
+                try:
+                    trans_text, used_existing = future.result()
+                except Exception as e:
+                    print(f"❌ Error processing {video_file.name}: {e}")
+                    continue
+                
+                if used_existing:
+                    print(f"   ⏩ Using existing transcription")
+                
+                if not trans_text:
+                    print(f"⚠️  Warning: No transcription text found for {video_file.name}")
+                    continue
+                
+                video_transcriptions[video_file] = trans_text
+                print(f"   ✅ Transcribed: {trans_text[:80]}...")
+    
+    # Keep folder order so matching results don't depend on completion order
+    video_transcriptions = {vf: video_transcriptions[vf] for vf in video_files if vf in video_transcriptions}
     
     if not video_transcriptions:
         print("\n❌ No videos were successfully transcribed")
@@ -210,13 +523,28 @@ def transcribe_and_match_videos(
     
     line_matches = []  # [(line_number, video_file, score, matched_text)]
     
+    # Clean every transcription once instead of once per script line
+    clean_dict = {vf.name: clean_text(t) for vf, t in video_transcriptions.items()}
+    
+    embedding_scores = None
+    if use_embeddings:
+        try:
+            embedding_scores = embedding_similarity(script_lines, clean_dict)
+        except ImportError:
+            print("⚠️  sentence-transformers not installed, using fuzzy matching")
+    video_names = list(clean_dict)
+    
     for line_num, script_line in enumerate(script_lines, 1):
         print(f"\n📝 Line {line_num}/{len(script_lines)}: \"{script_line[:60]}...\"")
         
-        # Convert video files to simple dict for matching
-        trans_dict = {vf.name: trans for vf, trans in video_transcriptions.items()}
-        
-        best_video_name, score, matched_text = find_best_video_for_line(script_line, trans_dict)
+        if embedding_scores is not None:
+            row = embedding_scores[line_num - 1]
+            best_index = int(row.argmax())
+            best_video_name = video_names[best_index]
+            score = float(row[best_index])
+            matched_text = clean_dict[best_video_name][:100]
+        else:
+            best_video_name, score, matched_text = find_best_video_for_line(script_line, clean_dict)
         
         if best_video_name:
             # Find the actual video file object
@@ -265,7 +593,7 @@ def transcribe_and_match_videos(
         new_name = f"{i:02d}_{video_file.stem}{video_file.suffix}"
         new_path = output_folder_path / new_name
         
-        shutil.copy2(video_file, new_path)
+        fast_copy(video_file, new_path)
         
         confidence_icon = "✅" if match["score"] >= min_confidence else "⚠️"
         print(f"{confidence_icon} {i:02d}. {video_file.name} → {new_name}")
@@ -274,30 +602,33 @@ def transcribe_and_match_videos(
     
     # Step 5: Save detailed matching report
     report_path = output_folder_path / "_matching_report.txt"
-    with open(report_path, "w") as f:
-        f.write("VIDEO MATCHING REPORT - LINE BY LINE\n")
-        f.write("=" * 70 + "\n\n")
-        f.write(f"Total script lines: {len(script_lines)}\n")
-        f.write(f"Total videos processed: {len(video_transcriptions)}\n")
-        f.write(f"Unique videos matched: {len(unique_matches)}\n")
-        f.write(f"Total line matches: {len(line_matches)}\n\n")
-        f.write("=" * 70 + "\n\n")
-        
-        for i, match in enumerate(unique_matches, 1):
-            f.write(f"VIDEO {i:02d}: {match['video_file'].name}\n")
-            f.write(f"  Script Line {match['line_number']}: {match['script_line']}\n")
-            f.write(f"  Confidence: {match['score']:.2%}\n")
-            f.write(f"  Matched Text: {match['matched_text']}\n")
-            f.write(f"  Full Transcription: {video_transcriptions[match['video_file']][:200]}...\n")
-            f.write("\n" + "-" * 70 + "\n\n")
-        
-        # Also list all line matches (including duplicates)
-        f.write("\n" + "=" * 70 + "\n")
-        f.write("ALL LINE MATCHES (including duplicates):\n")
-        f.write("=" * 70 + "\n\n")
-        for match in line_matches:
-            f.write(f"Line {match['line_number']}: {match['script_line']}\n")
-            f.write(f"  → {match['video_file'].name} ({match['score']:.2%})\n\n")
+    parts = []
+    parts.append("VIDEO MATCHING REPORT - LINE BY LINE\n")
+    parts.append("=" * 70 + "\n\n")
+    parts.append(f"Total script lines: {len(script_lines)}\n")
+    parts.append(f"Total videos processed: {len(video_transcriptions)}\n")
+    parts.append(f"Unique videos matched: {len(unique_matches)}\n")
+    parts.append(f"Total line matches: {len(line_matches)}\n\n")
+    parts.append("=" * 70 + "\n\n")
+    
+    for i, match in enumerate(unique_matches, 1):
+        parts.append(f"VIDEO {i:02d}: {match['video_file'].name}\n")
+        parts.append(f"  Script Line {match['line_number']}: {match['script_line']}\n")
+        parts.append(f"  Confidence: {match['score']:.2%}\n")
+        parts.append(f"  Matched Text: {match['matched_text']}\n")
+        parts.append(f"  Full Transcription: {video_transcriptions[match['video_file']][:200]}...\n")
+        parts.append("\n" + "-" * 70 + "\n\n")
+    
+    # Also list all line matches (including duplicates)
+    parts.append("\n" + "=" * 70 + "\n")
+    parts.append("ALL LINE MATCHES (including duplicates):\n")
+    parts.append("=" * 70 + "\n\n")
+    for match in line_matches:
+        parts.append(f"Line {match['line_number']}: {match['script_line']}\n")
+        parts.append(f"  → {match['video_file'].name} ({match['score']:.2%})\n\n")
+    
+    # One write instead of one call per line
+    report_path.write_text("".join(parts))
     
     print(f"\n✅ Complete! Ordered videos saved to: {output_folder_path}")
     print(f"📄 Detailed matching report saved to: {report_path}")
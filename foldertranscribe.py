@@ -5,6 +5,17 @@ Uses Apple's MLX acceleration for best speed and multi-language support.
 
 from transcribe_anything import transcribe
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import threading
+
+# mlx_whisper and its GPU lock are shared so packed and per-file passes never overlap
+from foldertosort import _mlx_lock, find_media_files, mlx_whisper, transcribe_in_process
+from video_utils import get_video_duration
+
+# Keeps multi-line status output from parallel workers from interleaving
+_print_lock = threading.Lock()
 
 def run_mac_transcription(
     source: str,
@@ -23,32 +34,145 @@ def run_mac_transcription(
         batch_size: Controls speed vs. memory (M4 handles 12–24 comfortably)
         prompt: Optional custom prompt for better recognition (e.g., domain terms)
 
+    Local files are transcribed in-process with mlx_whisper when it is
+    installed (batch_size is then unused); URLs always go through
+    transcribe-anything.
+
     Returns:
         str: Path to output directory with transcripts (txt, srt, vtt, json)
     """
-    print("🎧 Starting transcription with Apple MLX backend...")
-    print(f"🔹 Source: {source}")
-    print(f"🔹 Model: {model}, Batch size: {batch_size}")
-    if prompt:
-        print(f"🔹 Custom prompt: {prompt}")
-
-    output_path = transcribe(
-        url_or_file=source,
-        output_dir=output_dir,
-        model=model,
-        device="mlx",  # Apple Silicon optimized backend
-        other_args=[
-            "--batch_size", str(batch_size),
-            "--verbose",  # show live progress
-        ],
-        initial_prompt=prompt,
-    )
-
-    print(f"\n✅ Transcription complete!")
-    print(f"📁 Output saved in: {output_path}")
+    with _print_lock:
+        print("🎧 Starting transcription with Apple MLX backend...")
+        print(f"🔹 Source: {source}")
+        print(f"🔹 Model: {model}, Batch size: {batch_size}")
+        if prompt:
+            print(f"🔹 Custom prompt: {prompt}")
+
+    if mlx_whisper is not None and Path(source).is_file():
+        output_path = transcribe_in_process(source, output_dir, model, prompt)
+    else:
+        output_path = transcribe(
+            url_or_file=source,
+            output_dir=output_dir,
+            model=model,
+            device="mlx",  # Apple Silicon optimized backend
+            other_args=[
+                "--batch_size", str(batch_size),
+                "--verbose",  # show live progress
+            ],
+            initial_prompt=prompt,
+        )
+
+    with _print_lock:
+        print(f"\n✅ Transcription complete!")
+        print(f"📁 Output saved in: {output_path}")
     return output_path
 
 
+# Whisper decodes 30 s windows; shorter clips are packed together to fill them
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_WINDOW_SECONDS = 30.0
+CLIP_GAP_SECONDS = 0.5
+
+
+def _transcribe_packed(batch: list, output_base_dir: str, model: str, prompt: str | None):
+    """
+    Transcribe several short clips in one Whisper pass.
+    
+    The clips' 16 kHz audio is joined with short silences, transcribed with
+    word timestamps, and each word is assigned back to the clip whose time
+    range contains its midpoint. Each clip gets its own out.txt/out.json.
+    """
+    import numpy as np
+    
+    gap = np.zeros(int(CLIP_GAP_SECONDS * WHISPER_SAMPLE_RATE), dtype=np.float32)
+    pieces, bounds, offset = [], [], 0.0
+    for media_file in batch:
+        audio = np.asarray(mlx_whisper.audio.load_audio(str(media_file)), dtype=np.float32)
+        clip_seconds = len(audio) / WHISPER_SAMPLE_RATE
+        pieces += [audio, gap]
+        bounds.append((media_file, offset, offset + clip_seconds))
+        offset += clip_seconds + CLIP_GAP_SECONDS
+    
+    with _mlx_lock:
+        result = mlx_whisper.transcribe(
+            np.concatenate(pieces),
+            path_or_hf_repo=f"mlx-community/whisper-{model}-mlx",
+            initial_prompt=prompt,
+            word_timestamps=True,
+        )
+    
+    for media_file, start, end in bounds:
+        segments = []
+        for seg in result["segments"]:
+            words = [
+                dict(w, start=w["start"] - start, end=w["end"] - start)
+                for w in seg.get("words", [])
+                if start <= (w["start"] + w["end"]) / 2 < end
+            ]
+            if words:
+                segments.append({
+                    "start": words[0]["start"],
+                    "end": words[-1]["end"],
+                    "text": "".join(w["word"] for w in words),
+                    "words": words,
+                })
+        
+        text = "".join(seg["text"] for seg in segments).strip()
+        output_path = Path(output_base_dir) / media_file.stem
+        output_path.mkdir(parents=True, exist_ok=True)
+        (output_path / "out.txt").write_text(text)
+        (output_path / "out.json").write_text(json.dumps(
+            {"text": text, "segments": segments, "language": result.get("language")},
+            ensure_ascii=False,
+        ))
+
+
+def plan_packed_batches(media_files: list, durations: list) -> tuple:
+    """
+    Group clips shorter than a Whisper window into batches that fit one.
+    Returns (batches, remaining): remaining are the long or unreadable
+    files that need a per-file transcription.
+    """
+    batches, remaining = [], []
+    batch, batch_seconds = [], 0.0
+    
+    for media_file, clip_seconds in zip(media_files, durations):
+        if not 0 < clip_seconds <= WHISPER_WINDOW_SECONDS:
+            remaining.append(media_file)
+            continue
+        
+        if batch and batch_seconds + clip_seconds > WHISPER_WINDOW_SECONDS:
+            batches.append(batch)
+            batch, batch_seconds = [], 0.0
+        batch.append(media_file)
+        batch_seconds += clip_seconds + CLIP_GAP_SECONDS
+    
+    if batch:
+        batches.append(batch)
+    
+    return batches, remaining
+
+
+def transcribe_packed_batch(batch: list, output_base_dir: str, model: str, batch_size: int, prompt: str | None):
+    """Transcribe a batch from plan_packed_batches, one file at a time if packing fails."""
+    try:
+        _transcribe_packed(batch, output_base_dir, model, prompt)
+        with _print_lock:
+            print(f"   ✅ Packed {len(batch)} short clip(s) into one pass")
+    except Exception as e:
+        with _print_lock:
+            print(f"⚠️  Packed transcription failed ({e}), retrying clips one by one")
+        for media_file in batch:
+            run_mac_transcription(
+                source=str(media_file),
+                output_dir=f"{output_base_dir}/{media_file.stem}",
+                model=model,
+                batch_size=batch_size,
+                prompt=prompt,
+            )
+
+
 def transcribe_folder(
     folder_path: str,
     video_extensions: tuple = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"),
@@ -57,6 +181,8 @@ def transcribe_folder(
     model: str = "large-v3",
     batch_size: int = 12,
     prompt: str | None = None,
+    max_workers: int | None = None,
+    pack_short_clips: bool = True,
 ):
     """
     Transcribe all video/audio files in a folder.
@@ -69,12 +195,17 @@ def transcribe_folder(
         model: Whisper model name
         batch_size: Batch size for processing
         prompt: Optional prompt for all files
+        max_workers: Files transcribed concurrently (default: half the CPU cores).
+                     transcribe-anything runs each file in its own subprocess, so
+                     audio decode of one file overlaps inference of another.
+        pack_short_clips: With mlx_whisper installed, transcribe clips under 30 s
+                          several at a time in a single Whisper window
     """
     folder = Path(folder_path)
     all_extensions = video_extensions + audio_extensions
     
     # Find all media files
-    media_files = [f for f in folder.iterdir() if f.suffix.lower() in all_extensions]
+    media_files = find_media_files(folder, all_extensions)
     
     if not media_files:
         print(f"❌ No media files found in {folder_path}")
@@ -84,24 +215,47 @@ def transcribe_folder(
     print(f"\n📂 Found {len(media_files)} media file(s) to transcribe")
     print("=" * 60)
     
-    for i, media_file in enumerate(media_files, 1):
-        print(f"\n🎬 Processing {i}/{len(media_files)}: {media_file.name}")
-        print("-" * 60)
-        
-        # Create unique output folder for each file
-        output_dir = f"{output_base_dir}/{media_file.stem}"
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 2) // 2)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batches, remaining_files = [], media_files
+        if pack_short_clips and mlx_whisper is not None:
+            # PyAV reads the durations in-process, on the pool's threads
+            durations = list(executor.map(get_video_duration, media_files))
+            batches, remaining_files = plan_packed_batches(media_files, durations)
         
-        try:
-            run_mac_transcription(
+        # Packed batches share the pool with per-file transcriptions, so their
+        # audio decode overlaps the other files' inference
+        futures = {
+            executor.submit(
+                transcribe_packed_batch, batch, output_base_dir, model, batch_size, prompt
+            ): batch
+            for batch in batches
+        }
+        futures.update({
+            executor.submit(
+                run_mac_transcription,
                 source=str(media_file),
-                output_dir=output_dir,
+                # Create unique output folder for each file
+                output_dir=f"{output_base_dir}/{media_file.stem}",
                 model=model,
                 batch_size=batch_size,
                 prompt=prompt,
-            )
-        except Exception as e:
-            print(f"❌ Error processing {media_file.name}: {e}")
-            continue
+            ): [media_file]
+            for media_file in remaining_files
+        })
+        
+        for i, future in enumerate(as_completed(futures), 1):
+            names = ", ".join(media_file.name for media_file in futures[future])
+            try:
+                future.result()
+                with _print_lock:
+                    print(f"\n🎬 Finished {i}/{len(futures)}: {names}")
+                    print("-" * 60)
+            except Exception as e:
+                with _print_lock:
+                    print(f"❌ Error processing {names}: {e}")
     
     print(f"\n🎉 Batch transcription complete! Processed {len(media_files)} files.")
 
@@ -4,43 +4,76 @@ Finds ALL instances of each script line and lets you pick which one to use.
 """
 
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import json
-import re
+import os
 import subprocess
 from difflib import SequenceMatcher
-import tempfile
-import shutil
+from functools import lru_cache
 
+from video_utils import (
+    clean_text,
+    ffmpeg_error,
+    get_video_duration,
+    reap_stale_trash,
+    render_selection,
+    render_via_segments,
+)
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text for matching."""
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.strip()
+try:
+    import numpy as np
+    from rapidfuzz import fuzz, process
+except ImportError:  # Fall back to difflib's pure-Python matcher
+    np = fuzz = process = None
 
+try:
+    import ahocorasick  # pyahocorasick: finds every script line in one scan per transcript
+except ImportError:
+    ahocorasick = None
 
-def find_all_matches(script_line: str, video_transcriptions: dict, min_score: float = 0.6) -> list:
+try:
+    import orjson  # C JSON parser, reads bytes directly
+except ImportError:
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def _score_line(script_line_clean: str, trans_key: tuple, min_score: float) -> tuple:
     """
-    Find ALL videos that contain the script line.
-    Returns list of (video_file, score, matched_text) sorted by score.
+    Score one cleaned line against trans_key, a tuple of (video_file, cleaned
+    transcription) pairs. Returns (video_file, score, is_exact) sorted by
+    score; cached so repeated script lines are only scored once.
+    The difflib fallback turns off autojunk: on transcriptions over 200
+    characters it treats every common letter as junk and underscores matches.
     """
     matches = []
-    script_line_clean = clean_text(script_line)
-    
-    if not script_line_clean:
-        return matches
     
-    for video_file, transcription in video_transcriptions.items():
-        trans_clean = clean_text(transcription)
-        
-        # Check if line appears in transcription
+    # Exact containment is cheap and always a perfect match
+    fuzzy_candidates = []
+    for video_file, trans_clean in trans_key:
         if script_line_clean in trans_clean:
-            matches.append((video_file, 1.0, script_line))
-            continue
-        
+            matches.append((video_file, 1.0, True))
+        else:
+            fuzzy_candidates.append((video_file, trans_clean))
+    
+    if process is not None and fuzzy_candidates:
+        # partial_ratio scores the best substring alignment, which covers the
+        # sliding-window phrase search; cdist scores all videos in C++
+        scores = process.cdist(
+            [script_line_clean],
+            [trans_clean for _, trans_clean in fuzzy_candidates],
+            scorer=fuzz.partial_ratio,
+            workers=-1,
+            score_cutoff=min_score * 100,
+        )[0]
+        for (video_file, _), score in zip(fuzzy_candidates, scores):
+            if score:
+                matches.append((video_file, float(score) / 100.0, False))
+        fuzzy_candidates = []
+    
+    for video_file, trans_clean in fuzzy_candidates:
         # Calculate similarity
-        score = SequenceMatcher(None, script_line_clean, trans_clean).ratio()
+        score = SequenceMatcher(None, script_line_clean, trans_clean, autojunk=False).ratio()
         
         # Also check for partial phrase matches
         line_words = script_line_clean.split()
@@ -54,11 +87,111 @@ def find_all_matches(script_line: str, video_transcriptions: dict, min_score: fl
                             score = phrase_score
         
         if score >= min_score:
-            matches.append((video_file, score, transcription[:80]))
+            matches.append((video_file, score, False))
     
     # Sort by score (highest first)
     matches.sort(key=lambda x: x[1], reverse=True)
-    return matches
+    return tuple(matches)
+
+
+def find_all_matches(
+    script_line: str,
+    video_transcriptions: dict,
+    min_score: float = 0.6,
+    cleaned_transcriptions: dict | None = None,
+) -> list:
+    """
+    Find ALL videos that contain the script line.
+    Returns list of (video_file, score, matched_text) sorted by score.
+    
+    Pass cleaned_transcriptions (name -> clean_text(transcription)) when
+    matching many lines so each transcription is only cleaned once.
+    """
+    script_line_clean = clean_text(script_line)
+    
+    if not script_line_clean:
+        return []
+    
+    if cleaned_transcriptions is None:
+        cleaned_transcriptions = {vf: clean_text(t) for vf, t in video_transcriptions.items()}
+    
+    trans_key = tuple(cleaned_transcriptions.items())
+    return [
+        (video_file, score, script_line if is_exact else video_transcriptions[video_file][:80])
+        for video_file, score, is_exact in _score_line(script_line_clean, trans_key, min_score)
+    ]
+
+
+def containment_matrix(cleaned_lines: list, cleaned_trans: list) -> list:
+    """exact[i][j] is True when script line i appears verbatim in transcription j."""
+    if ahocorasick is None:
+        return [[line in trans for trans in cleaned_trans] for line in cleaned_lines]
+    
+    exact = [[False] * len(cleaned_trans) for _ in cleaned_lines]
+    automaton = ahocorasick.Automaton()
+    for i, line in enumerate(cleaned_lines):
+        if line:
+            # Repeated script lines share one key
+            automaton.add_word(line, automaton.get(line, ()) + (i,))
+    if not len(automaton):
+        return exact
+    automaton.make_automaton()
+    
+    for j, trans in enumerate(cleaned_trans):
+        for _, line_indices in automaton.iter(trans):
+            for i in line_indices:
+                exact[i][j] = True
+    return exact
+
+
+def find_all_matches_batch(
+    script_lines: list,
+    video_transcriptions: dict,
+    min_score: float = 0.6,
+    cleaned_transcriptions: dict | None = None,
+) -> list:
+    """
+    Match every script line against every transcription in one pass.
+    Returns one find_all_matches-style list per script line.
+    """
+    if cleaned_transcriptions is None:
+        cleaned_transcriptions = {vf: clean_text(t) for vf, t in video_transcriptions.items()}
+    
+    if process is None or not script_lines or not cleaned_transcriptions:
+        return [
+            find_all_matches(line, video_transcriptions, min_score, cleaned_transcriptions)
+            for line in script_lines
+        ]
+    
+    names = list(cleaned_transcriptions)
+    cleaned_trans = [cleaned_transcriptions[name] for name in names]
+    cleaned_lines = [clean_text(line) for line in script_lines]
+    
+    # Repeated script lines are scored once and share a matrix row
+    unique_lines = list(dict.fromkeys(cleaned_lines))
+    row_of = {line: row for row, line in enumerate(unique_lines)}
+    
+    # Lines x videos similarity matrix, scored in C++ across all cores
+    scores = process.cdist(
+        unique_lines, cleaned_trans, scorer=fuzz.partial_ratio, workers=-1, dtype=np.float32
+    ) / 100.0
+    exact = np.array(containment_matrix(unique_lines, cleaned_trans), dtype=bool).reshape(scores.shape)
+    scores[exact] = 1.0
+    rows = [row_of[line] for line in cleaned_lines]
+    scores, exact = scores[rows], exact[rows]
+    
+    all_matches = []
+    for script_line, line_clean, row, exact_row in zip(script_lines, cleaned_lines, scores, exact):
+        matches = []
+        if line_clean:
+            for j in np.argsort(-row, kind='stable'):
+                if row[j] < min_score:
+                    break
+                name = names[j]
+                preview = script_line if exact_row[j] else video_transcriptions[name][:80]
+                matches.append((name, float(row[j]), preview))
+        all_matches.append(matches)
+    return all_matches
 
 
 def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
@@ -69,6 +202,13 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     if not phrase_clean or not text_clean:
         return (0.0, 1.0)
     
+    if fuzz is not None:
+        # Best-aligned substring in one call; offsets are character positions
+        alignment = fuzz.partial_ratio_alignment(phrase_clean, text_clean, score_cutoff=50)
+        if alignment is None:
+            return (0.0, 1.0)
+        return (alignment.dest_start / len(text_clean), alignment.dest_end / len(text_clean))
+    
     phrase_words = phrase_clean.split()
     text_words = text_clean.split()
     
@@ -77,7 +217,7 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     
     for i in range(len(text_words) - len(phrase_words) + 1):
         window = ' '.join(text_words[i:i + len(phrase_words)])
-        score = SequenceMatcher(None, phrase_clean, window).ratio()
+        score = SequenceMatcher(None, phrase_clean, window, autojunk=False).ratio()
         if score > best_score:
             best_score = score
             best_start = i
@@ -92,85 +232,53 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     return (start_ratio, end_ratio)
 
 
-def get_video_duration(video_path: str) -> float:
-    """Get video duration in seconds."""
-    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-           '-of', 'default=noprint_wrappers=1:nokey=1', str(video_path)]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    try:
-        return float(result.stdout.strip())
-    except (ValueError, TypeError):
-        return 0.0
+_transcription_cache = {}  # transcript file -> (mtime_ns, text)
 
 
 def get_transcription_text(output_dir: str) -> str:
-    """Extract text from transcription output."""
-    txt_file = Path(output_dir) / "out.txt"
-    if txt_file.exists():
-        return txt_file.read_text()
-    
-    json_file = Path(output_dir) / "out.json"
-    if json_file.exists():
-        data = json.loads(json_file.read_text())
-        if isinstance(data, dict) and "text" in data:
-            return data["text"]
-        elif isinstance(data, list):
-            return " ".join([seg.get("text", "") for seg in data])
+    """Extract text from transcription output, reparsing only when it changes."""
+    for name in ("out.txt", "out.json"):
+        path = Path(output_dir) / name
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            continue
+        
+        cached = _transcription_cache.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        
+        if name == "out.txt":
+            text = path.read_text()
+        else:
+            raw = path.read_bytes()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            if isinstance(data, dict) and "text" in data:
+                text = data["text"]
+            elif isinstance(data, list):
+                text = " ".join([seg.get("text", "") for seg in data])
+            else:
+                text = ""
+        
+        _transcription_cache[path] = (mtime_ns, text)
+        return text
     
     return ""
 
 
-def extract_video_segment(video_path: str, start_time: float, end_time: float, output_path: str):
-    """Extract a segment from video with audio normalization."""
-    duration = end_time - start_time
-    
-    # Use loudnorm filter to normalize audio levels to -16 LUFS (standard for video)
-    cmd = [
-        'ffmpeg', '-ss', str(start_time), '-i', str(video_path), '-t', str(duration),
-        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '23',
-        '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Audio normalization
-        '-c:a', 'aac', '-b:a', '192k', '-ar', '48000',
-        '-movflags', '+faststart', '-pix_fmt', 'yuv420p', '-y', str(output_path)
-    ]
-    
-    subprocess.run(cmd, capture_output=True, check=True)
-
-
-def concatenate_videos(video_paths: list, output_path: str):
-    """Concatenate multiple videos with perfect audio/video sync (optimized for speed)."""
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-        for video_path in video_paths:
-            f.write(f"file '{Path(video_path).absolute()}'\n")
-        list_file = f.name
-    
-    try:
-        # Re-encode to prevent audio drift and sync issues
-        cmd = [
-            'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', list_file,
-            # Video encoding with constant framerate (fast preset)
-            '-c:v', 'libx264',
-            '-preset', 'veryfast',
-            '-crf', '23',
-            '-r', '24',  # Force constant 24fps
-            '-vsync', 'cfr',  # Constant frame rate (fixes drift)
-            # Audio normalization and encoding
-            '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Normalize overall audio
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-ar', '48000',  # Consistent sample rate
-            '-async', '1',  # Audio sync correction
-            # Output settings
-            '-movflags', '+faststart',
-            '-pix_fmt', 'yuv420p',
-            '-y',
-            str(output_path)
-        ]
-        subprocess.run(cmd, capture_output=True, check=True)
-    finally:
-        Path(list_file).unlink()
+def load_video_transcription(trans_dir: Path, video_folder_path: Path) -> tuple | None:
+    """Return (video_path, transcription) for a transcription folder, or None."""
+    trans_text = get_transcription_text(str(trans_dir))
+    if not trans_text:
+        return None
+    
+    # Find corresponding video file
+    video_extensions = [".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"]
+    for ext in video_extensions:
+        video_path = video_folder_path / f"{trans_dir.name}{ext}"
+        if video_path.exists():
+            return (video_path, trans_text)
+    return None
 
 
 def interactive_splice_videos(
@@ -179,17 +287,22 @@ def interactive_splice_videos(
     master_script_file: str,
     output_video: str = "final_script_video.mp4",
     temp_folder: str = "temp_segments",
+    max_workers: int | None = None,
 ):
     """
     Interactive video splicer - choose the best take for each line.
+    Selected segments are extracted with up to max_workers (default: CPU
+    count) ffmpeg processes at once.
     """
     print("\n🎬 Interactive Video Splicer")
     print("=" * 70)
     
+    reap_stale_trash(temp_folder)
+    
     # Read master script
     print("\n📜 Reading master script...")
-    master_script = Path(master_script_file).read_text()
-    script_lines = [line.strip() for line in master_script.split('\n') if line.strip()]
+    with open(master_script_file, 'r', encoding='utf-8') as f:
+        script_lines = [line.strip() for line in f if line.strip()]
     print(f"   Found {len(script_lines)} lines in script")
     
     # Load all transcriptions
@@ -197,19 +310,12 @@ def interactive_splice_videos(
     transcription_folder_path = Path(transcription_folder)
     video_folder_path = Path(video_folder)
     
-    video_transcriptions = {}
-    
-    for trans_dir in transcription_folder_path.iterdir():
-        if trans_dir.is_dir():
-            trans_text = get_transcription_text(str(trans_dir))
-            if trans_text:
-                # Find corresponding video file
-                video_extensions = [".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"]
-                for ext in video_extensions:
-                    video_path = video_folder_path / f"{trans_dir.name}{ext}"
-                    if video_path.exists():
-                        video_transcriptions[video_path] = trans_text
-                        break
+    # Reads and JSON parsing overlap across threads
+    trans_dirs = [d for d in transcription_folder_path.iterdir() if d.is_dir()]
+    with ThreadPoolExecutor() as executor:
+        results = list(executor.map(lambda d: load_video_transcription(d, video_folder_path), trans_dirs))
+    video_transcriptions = dict(r for r in results if r)
+    name_to_path = {vf.name: vf for vf in video_transcriptions}
     
     print(f"   Loaded {len(video_transcriptions)} video transcriptions")
     
@@ -220,13 +326,19 @@ def interactive_splice_videos(
     
     user_selections = []  # [(line_number, video_file, script_line)]
     
+    # Name-keyed transcriptions, cleaned once for every line
+    trans_dict = {vf.name: trans for vf, trans in video_transcriptions.items()}
+    cleaned_dict = {name: clean_text(trans) for name, trans in trans_dict.items()}
+    
+    # Score every line against every take up front
+    all_matches = find_all_matches_batch(script_lines, trans_dict, min_score=0.5, cleaned_transcriptions=cleaned_dict)
+    
     for line_num, script_line in enumerate(script_lines, 1):
         print(f"\n📝 Line {line_num}/{len(script_lines)}: \"{script_line}\"")
         print("-" * 70)
         
-        # Find all matching videos
-        trans_dict = {vf.name: trans for vf, trans in video_transcriptions.items()}
-        matches = find_all_matches(script_line, trans_dict, min_score=0.5)
+        # All matching videos for this line
+        matches = all_matches[line_num - 1]
         
         if not matches:
             print("   ❌ No matches found for this line!")
@@ -255,8 +367,7 @@ def interactive_splice_videos(
                 if 1 <= choice_num <= len(matches):
                     selected_video_name = matches[choice_num - 1][0]
                     # Find the actual video file object
-                    selected_video = next(vf for vf in video_transcriptions.keys() 
-                                         if vf.name == selected_video_name)
+                    selected_video = name_to_path[selected_video_name]
                     
                     user_selections.append({
                         'line_number': line_num,
@@ -280,12 +391,14 @@ def interactive_splice_videos(
     print(f"✂️  EXTRACTING {len(user_selections)} SELECTED SEGMENTS")
     print("=" * 70)
     
-    temp_path = Path(temp_folder)
-    temp_path.mkdir(exist_ok=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
     
-    segment_paths = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        durations = list(executor.map(get_video_duration, [sel['video_file'] for sel in user_selections]))
     
-    for i, selection in enumerate(user_selections, 1):
+    segments = []
+    for i, (selection, video_duration) in enumerate(zip(user_selections, durations), 1):
         video_file = selection['video_file']
         script_line = selection['script_line']
         
@@ -296,35 +409,32 @@ def interactive_splice_videos(
         
         # Find timing
         start_ratio, end_ratio = find_phrase_in_text(script_line, trans_text)
-        video_duration = get_video_duration(video_file)
         start_time = max(0, start_ratio * video_duration - 0.1)
         end_time = min(video_duration, end_ratio * video_duration + 0.1)
         
-        # Extract segment
-        segment_path = temp_path / f"segment_{i:03d}.mp4"
-        
-        try:
-            extract_video_segment(video_file, start_time, end_time, segment_path)
-            segment_paths.append(segment_path)
-            print(f"    ✅ Extracted [{start_time:.2f}s - {end_time:.2f}s]")
-        except Exception as e:
-            print(f"    ❌ Error: {e}")
+        segments.append((video_file, start_time, end_time))
+        print(f"    ✂️  Cut [{start_time:.2f}s - {end_time:.2f}s]")
     
-    # Concatenate
-    print(f"\n🔗 Stitching {len(segment_paths)} segments together...")
+    # Cut and join everything in a single encode
+    print(f"\n🔗 Stitching {len(segments)} segments together...")
     
     try:
-        concatenate_videos(segment_paths, output_video)
+        try:
+            render_selection(segments, output_video)
+            rendered = len(segments)
+        except subprocess.CalledProcessError as e:
+            print(f"   ⚠️  Single-pass render failed ({ffmpeg_error(e)}), extracting segments one by one...")
+            rendered = render_via_segments(segments, output_video, temp_folder, max_workers)
+        
+        if not rendered:
+            print("\n❌ No segments were extracted")
+            return
         print(f"\n✅ SUCCESS! Video saved to: {output_video}")
-        print(f"   Total segments: {len(segment_paths)}")
+        print(f"   Total segments: {rendered}")
     except Exception as e:
         print(f"\n❌ Error concatenating: {e}")
         return
     
-    # Cleanup
-    print(f"\n🧹 Cleaning up...")
-    shutil.rmtree(temp_path)
-    
     print("\n🎉 Done! Your custom video is ready!")
 
 
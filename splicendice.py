@@ -4,20 +4,46 @@ Creates a clean video with ONLY the words from your script, perfectly timed.
 """
 
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
 import re
 import subprocess
 from difflib import SequenceMatcher
-import tempfile
-import shutil
 
+from video_utils import (
+    clean_text,
+    discard_folder,
+    ffmpeg_error,
+    get_video_duration,
+    reap_stale_trash,
+    render_selection,
+    render_via_segments,
+    run_ffmpeg,
+)
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text for matching."""
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.strip()
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # Fall back to the difflib sliding window
+    fuzz = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import av  # PyAV: in-process stream-copy remux
+except ImportError:
+    av = None
+
+try:
+    import orjson  # C JSON parser, reads bytes directly
+except ImportError:
+    orjson = None
+
+
+_VIDEO_RE = re.compile(r'VIDEO \d+: (.+\.MP4)', re.IGNORECASE)
 
 
 def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
@@ -31,6 +57,14 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     if not phrase_clean or not text_clean:
         return (0.0, 1.0)
     
+    if fuzz is not None:
+        # Best-aligned substring in one call; offsets are character positions
+        alignment = fuzz.partial_ratio_alignment(phrase_clean, text_clean, score_cutoff=50)
+        if alignment is None:
+            # If no good match, return full duration
+            return (0.0, 1.0)
+        return (alignment.dest_start / len(text_clean), alignment.dest_end / len(text_clean))
+    
     # Find best match position
     phrase_words = phrase_clean.split()
     text_words = text_clean.split()
@@ -40,7 +74,7 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     
     for i in range(len(text_words) - len(phrase_words) + 1):
         window = ' '.join(text_words[i:i + len(phrase_words)])
-        score = SequenceMatcher(None, phrase_clean, window).ratio()
+        score = SequenceMatcher(None, phrase_clean, window, autojunk=False).ratio()
         if score > best_score:
             best_score = score
             best_start = i
@@ -58,99 +92,167 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     return (start_ratio, end_ratio)
 
 
-def get_video_duration(video_path: str) -> float:
-    """Get video duration in seconds using ffprobe."""
-    cmd = [
-        'ffprobe',
-        '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        str(video_path)
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    duration_str = result.stdout.strip()
-    
-    if not duration_str:
-        # Fallback: try getting duration from stream info
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        duration_str = result.stdout.strip()
+def segment_times(start_ratios: list, end_ratios: list, durations: list, padding: float = 0.1) -> tuple:
+    """
+    Turn transcript position ratios into (start_times, end_times), padded to
+    capture full words and clipped to each video's duration.
+    """
+    if np is not None:
+        durations = np.asarray(durations, dtype=float)
+        starts = np.clip(np.asarray(start_ratios, dtype=float) * durations - padding, 0, None)
+        ends = np.minimum(durations, np.asarray(end_ratios, dtype=float) * durations + padding)
+        return starts.tolist(), ends.tolist()
     
+    starts = [max(0, ratio * duration - padding) for ratio, duration in zip(start_ratios, durations)]
+    ends = [min(duration, ratio * duration + padding) for ratio, duration in zip(end_ratios, durations)]
+    return starts, ends
+
+
+def probe_stream_params(video_path) -> tuple | None:
+    """
+    (video codec, width, height, fps, pix_fmt, audio codec, sample rate, channels)
+    for a file, or None when PyAV is missing or can't read it. The audio
+    fields are None for video-only files.
+    """
+    if av is None:
+        return None
     try:
-        return float(duration_str)
-    except (ValueError, TypeError):
-        return 0.0
+        with av.open(str(video_path)) as container:
+            video = container.streams.video[0].codec_context
+            params = (
+                video.name, video.width, video.height, container.streams.video[0].average_rate,
+                video.pix_fmt,
+            )
+            if not container.streams.audio:
+                return params + (None, None, None)  # Video-only source
+            audio = container.streams.audio[0].codec_context
+            return params + (audio.name, audio.sample_rate, audio.channels)
+    except Exception:
+        return None
 
 
-def extract_video_segment(video_path: str, start_time: float, end_time: float, output_path: str):
-    """Extract a segment from video with audio normalization."""
-    duration = end_time - start_time
-    
-    cmd = [
-        'ffmpeg',
-        '-ss', str(start_time),  # Seek before input for faster processing
-        '-i', str(video_path),
-        '-t', str(duration),
-        # Re-encode with fast settings for speed
-        '-c:v', 'libx264',  # H.264 video codec
-        '-preset', 'ultrafast',  # Faster encoding
-        '-crf', '23',  # Good quality, faster encoding
-        '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Audio normalization
-        '-c:a', 'aac',  # AAC audio codec
-        '-b:a', '192k',  # Audio bitrate
-        '-ar', '48000',  # Audio sample rate
-        '-movflags', '+faststart',  # Optimize for streaming
-        '-pix_fmt', 'yuv420p',  # Ensure compatibility
-        '-y',
-        str(output_path)
-    ]
-    
-    subprocess.run(cmd, capture_output=True, check=True)
+def sources_share_params(video_paths: list) -> bool:
+    """True when every source has identical, known stream parameters."""
+    params = {probe_stream_params(path) for path in set(video_paths)}
+    return len(params) == 1 and None not in params
+
+
+def remux_segments(segments: list, output_path: str):
+    """
+    Stream-copy (video_path, start_time, end_time) segments into one file
+    in-process with PyAV. Packets are rebased onto one continuous timeline,
+    so no ffmpeg process or temp file is needed. Each cut starts on the
+    keyframe at or before start_time and keeps every video packet decoded
+    before end_time, including the reference frames that the last B-frames
+    need; those can show a few frames past end_time, and the audio runs on
+    to the end of the video so the next cut stays in sync.
+    """
+    with av.open(str(output_path), 'w', options={'movflags': 'faststart'}) as output:
+        out_streams = None  # {'video': stream, 'audio': stream}
+        offset = 0.0  # Seconds already written to the output
+        
+        for video_path, start_time, end_time in segments:
+            with av.open(str(video_path)) as source:
+                in_streams = [source.streams.video[0], *source.streams.audio[:1]]
+                if out_streams is None:
+                    out_streams = {stream.type: output.add_stream_from_template(stream) for stream in in_streams}
+                in_streams = [stream for stream in in_streams if stream.type in out_streams]
+                
+                source.seek(int(start_time * av.time_base), backward=True)
+                seg_start = None
+                seg_end = 0.0
+                video_end = end_time  # Pushed out by reference frames shown after end_time
+                video_done = False
+                
+                for packet in source.demux(*in_streams):
+                    if packet.pts is None or packet.dts is None:
+                        continue  # Flush packet at end of file
+                    is_video = packet.stream.type == 'video'
+                    pts_time = float(packet.pts * packet.time_base)
+                    dts_time = float(packet.dts * packet.time_base)
+                    
+                    if seg_start is None:
+                        if not is_video:
+                            continue  # Start on the video keyframe
+                        seg_start = dts_time
+                    if is_video:
+                        if video_done or dts_time >= end_time:
+                            video_done = True  # Decode order: every frame shown before end_time has arrived
+                            if len(in_streams) == 1:
+                                break
+                            continue
+                    elif pts_time >= video_end:
+                        if video_done:
+                            break
+                        continue
+                    if dts_time < seg_start:
+                        continue  # Audio from before the keyframe
+                    
+                    packet_end = pts_time + float((packet.duration or 0) * packet.time_base)
+                    if is_video:
+                        video_end = max(video_end, packet_end)
+                    shift = round((offset - seg_start) / packet.time_base)
+                    packet.pts += shift
+                    packet.dts += shift
+                    packet.stream = out_streams[packet.stream.type]
+                    output.mux(packet)
+                    seg_end = max(seg_end, packet_end)
+                
+                if seg_start is not None:
+                    offset += seg_end - seg_start
 
 
-def concatenate_videos(video_paths: list, output_path: str):
-    """Concatenate multiple videos with perfect audio/video sync (optimized for speed)."""
-    # Create a temporary file list for ffmpeg
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-        for video_path in video_paths:
-            f.write(f"file '{Path(video_path).absolute()}'\n")
-        list_file = f.name
+def render_stream_copy(segments: list, output_path: str, temp_folder: str, max_workers: int) -> int:
+    """
+    Join segments without re-encoding when all sources share codec settings.
+    Cuts snap to the nearest keyframe and the audio is not loudness-normalized.
+    Returns how many segments were joined; raises CalledProcessError on failure.
+    """
+    if av is not None:
+        try:
+            # In-process remux: no per-segment ffmpeg startup
+            remux_segments(segments, output_path)
+            return len(segments)
+        except (av.FFmpegError, OSError, IndexError, ValueError) as e:
+            print(f"   ⚠️  In-process remux failed ({e}), using ffmpeg...")
+    
+    temp_path = Path(temp_folder)
+    temp_path.mkdir(exist_ok=True)
+    segment_paths = [temp_path / f"segment_{i:03d}.mp4" for i in range(1, len(segments) + 1)]
+    list_file = temp_path / "segments.txt"
+    
+    def copy_segment(args):
+        (video_path, start_time, end_time), segment_path = args
+        run_ffmpeg([
+            'ffmpeg',
+            '-ss', str(start_time),
+            '-i', str(video_path),
+            '-t', str(end_time - start_time),
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-y',
+            str(segment_path)
+        ])
     
     try:
-        # Re-encode to prevent audio drift and sync issues
-        cmd = [
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(copy_segment, zip(segments, segment_paths)))
+        
+        list_file.write_text("".join(f"file '{p.absolute()}'\n" for p in segment_paths))
+        run_ffmpeg([
             'ffmpeg',
             '-f', 'concat',
             '-safe', '0',
-            '-i', list_file,
-            # Video encoding with constant framerate (fast preset)
-            '-c:v', 'libx264',
-            '-preset', 'veryfast',
-            '-crf', '23',
-            '-r', '24',  # Force constant 24fps
-            '-vsync', 'cfr',  # Constant frame rate (fixes drift)
-            # Audio normalization and encoding
-            '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Normalize overall audio
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-ar', '48000',  # Consistent sample rate
-            '-async', '1',  # Audio sync correction
-            # Output settings
+            '-i', str(list_file),
+            '-c', 'copy',
             '-movflags', '+faststart',
-            '-pix_fmt', 'yuv420p',
             '-y',
             str(output_path)
-        ]
-        subprocess.run(cmd, capture_output=True, check=True)
+        ])
     finally:
-        Path(list_file).unlink()
+        discard_folder(temp_path)
+    
+    return len(segment_paths)
 
 
 def splice_videos_by_script(
@@ -159,6 +261,8 @@ def splice_videos_by_script(
     video_folder: str,
     output_video: str = "final_spliced_video.mp4",
     temp_folder: str = "temp_segments",
+    max_workers: int | None = None,
+    stream_copy: bool = False,
 ):
     """
     Main function: Extract and splice video segments matching the script.
@@ -169,43 +273,40 @@ def splice_videos_by_script(
         video_folder: Folder containing the original videos
         output_video: Name for the final stitched video
         temp_folder: Temporary folder for video segments
+        max_workers: Concurrent ffmpeg processes (default: CPU count)
+        stream_copy: Join without re-encoding when all sources share codec
+                     settings. Much faster, but cuts snap to keyframes and the
+                     audio is neither loudness-normalized nor forced to 24 fps CFR
     """
     print("🎬 Video Splicer - Creating script-perfect video")
     print("=" * 70)
     
-    # Create temp folder
-    temp_path = Path(temp_folder)
-    temp_path.mkdir(exist_ok=True)
+    reap_stale_trash(temp_folder)
     
     # Parse the matching report to get video-line pairs
     print("\n📄 Reading matching report...")
     report_path = Path(matching_report_path)
     
     video_matches = []
-    with open(report_path, 'r') as f:
-        lines = f.readlines()
-        
-    # Parse report
-    i = 0
-    while i < len(lines):
-        if lines[i].startswith("VIDEO "):
-            # Extract video name
-            video_line = lines[i]
-            match = re.search(r'VIDEO \d+: (.+\.MP4)', video_line, re.IGNORECASE)
-            if match:
-                video_name = match.group(1)
-                script_line = lines[i+1].split(": ", 1)[1].strip() if i+1 < len(lines) else ""
-                
-                video_matches.append({
-                    "video_name": video_name,
-                    "script_line": script_line,
-                })
-        i += 1
+    lines = report_path.read_text().splitlines()
+    
+    # Parse report: each "VIDEO NN: name" line is followed by its script line
+    for idx, line in enumerate(lines):
+        match = _VIDEO_RE.match(line)
+        if match:
+            video_name = match.group(1)
+            script_line = lines[idx + 1].split(": ", 1)[1] if idx + 1 < len(lines) else ""
+            
+            video_matches.append({
+                "video_name": video_name,
+                "script_line": script_line,
+            })
     
     print(f"   Found {len(video_matches)} video segments to extract")
     
-    # Extract each segment
-    segment_paths = []
+    # Locate each segment
+    planned = []  # (index, video_name, script_line, video_path, start_ratio, end_ratio)
+    transcripts = {}  # out.json path -> transcription text
     video_folder_path = Path(video_folder)
     transcription_folder_path = Path(transcription_folder)
     
@@ -234,51 +335,71 @@ def splice_videos_by_script(
             print(f"   ⚠️  Transcription not found: {video_name}")
             continue
         
-        with open(trans_path, 'r') as f:
-            trans_data = json.load(f)
-            full_transcription = trans_data.get("text", "")
+        # A video can cover several lines; parse its transcription once
+        full_transcription = transcripts.get(trans_path)
+        if full_transcription is None:
+            raw = trans_path.read_bytes()
+            trans_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            full_transcription = transcripts[trans_path] = trans_data.get("text", "")
         
         # Find where script line appears in transcription
         start_ratio, end_ratio = find_phrase_in_text(script_line, full_transcription)
-        
-        # Get video duration and calculate timestamps
-        video_duration = get_video_duration(video_path)
-        start_time = start_ratio * video_duration
-        end_time = end_ratio * video_duration
-        
-        # Add small padding (0.1 seconds) to capture full words
-        start_time = max(0, start_time - 0.1)
-        end_time = min(video_duration, end_time + 0.1)
-        
-        # Extract segment
-        segment_path = temp_path / f"segment_{i:03d}.mp4"
-        
-        try:
-            extract_video_segment(video_path, start_time, end_time, segment_path)
-            segment_paths.append(segment_path)
-            
-            duration = end_time - start_time
-            print(f"   ✅ {i:02d}. {video_name} [{start_time:.2f}s - {end_time:.2f}s] ({duration:.2f}s)")
-            print(f"        \"{script_line[:60]}...\"")
-        except Exception as e:
-            print(f"   ❌ Error extracting {video_name}: {e}")
-            continue
+        planned.append((i, video_name, script_line, video_path, start_ratio, end_ratio))
     
-    if not segment_paths:
+    if not planned:
         print("\n❌ No segments were extracted")
         return
     
-    # Concatenate all segments
-    print(f"\n🔗 Stitching {len(segment_paths)} segments together...")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    
+    # Get video durations and calculate timestamps
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        durations = list(executor.map(get_video_duration, [plan[3] for plan in planned]))
+    
+    # Add small padding (0.1 seconds) to capture full words
+    start_times, end_times = segment_times(
+        [plan[4] for plan in planned], [plan[5] for plan in planned], durations
+    )
+    
+    segments = []
+    for (i, video_name, script_line, video_path, _, _), start_time, end_time in zip(planned, start_times, end_times):
+        segments.append((video_path, start_time, end_time))
+        
+        duration = end_time - start_time
+        print(f"   ✅ {i:02d}. {video_name} [{start_time:.2f}s - {end_time:.2f}s] ({duration:.2f}s)")
+        print(f"        \"{script_line[:60]}...\"")
+    
+    # Cut and join all segments in a single encode
+    print(f"\n🔗 Stitching {len(segments)} segments together...")
     
     try:
-        concatenate_videos(segment_paths, output_video)
+        rendered = 0
+        if stream_copy and sources_share_params([segment[0] for segment in segments]):
+            # Same camera settings everywhere: cut and join without re-encoding
+            print("   ⚡ All sources share codec settings, stream copying...")
+            try:
+                rendered = render_stream_copy(segments, output_video, temp_folder, max_workers)
+            except subprocess.CalledProcessError as e:
+                print(f"   ⚠️  Stream copy failed ({ffmpeg_error(e)}), re-encoding instead...")
+        
+        if not rendered:
+            try:
+                render_selection(segments, output_video)
+                rendered = len(segments)
+            except subprocess.CalledProcessError as e:
+                print(f"   ⚠️  Single-pass render failed ({ffmpeg_error(e)}), extracting segments one by one...")
+                rendered = render_via_segments(segments, output_video, temp_folder, max_workers)
+        
+        if not rendered:
+            print("\n❌ No segments were extracted")
+            return
         print(f"\n✅ SUCCESS! Final video saved to: {output_video}")
-        print(f"   Total segments: {len(segment_paths)}")
+        print(f"   Total segments: {rendered}")
         
         # Calculate total duration (non-critical, don't fail if this errors)
         try:
-            total_duration = sum([get_video_duration(str(p)) for p in segment_paths])
+            total_duration = get_video_duration(output_video)
             if total_duration > 0:
                 print(f"   Total duration: {total_duration:.2f} seconds")
         except Exception as e:
@@ -290,10 +411,6 @@ def splice_videos_by_script(
         traceback.print_exc()
         return
     
-    # Cleanup temp folder
-    print(f"\n🧹 Cleaning up temporary files...")
-    shutil.rmtree(temp_path)
-    
     print("\n🎉 Done! Your script-perfect video is ready!")
 
 
@@ -305,4 +422,5 @@ if __name__ == "__main__":
         video_folder="totranscribe",  # Your original videos
         output_video="final_script_video.mp4",
         temp_folder="temp_segments",
+        stream_copy=False,  # True: fast keyframe cuts, no loudnorm (same-camera footage only)
     )
\ No newline at end of file
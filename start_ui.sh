@@ -3,8 +3,8 @@
 echo "🎬 Video Take Selector UI"
 echo "=========================="
 echo ""
-echo "Installing Flask if needed..."
-pip3 install Flask
+echo "Installing Flask and gunicorn if needed..."
+pip3 install Flask gunicorn
 
 echo ""
 echo "Starting web server..."
@@ -13,5 +13,7 @@ echo ""
 echo "Press Ctrl+C to stop the server"
 echo ""
 
-python3 video_selector_ui.py
+# One worker: selector state lives in the process. Threads serve video
+# range requests and API calls side by side.
+exec gunicorn -w 1 -k gthread --threads 32 --bind 127.0.0.1:5000 video_selector_ui:app
 
@@ -2,49 +2,189 @@
 Video Selector UI - Web interface to choose the best take for each line
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from pathlib import Path
 import json
-import re
 import subprocess
 from difflib import SequenceMatcher
+from functools import lru_cache
 import tempfile
 import shutil
 import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import os
+import struct
+import hashlib
+import pickle
+from dataclasses import dataclass, field
+import bisect
+import heapq
+from collections import deque
+
+from video_utils import clean_text, video_encoder_args
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Fall back to difflib's pure-Python matcher
+    fuzz = process = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 
+# Behind a proxy that honours X-Sendfile, let it stream the videos itself
+app.config['USE_X_SENDFILE'] = bool(os.environ.get('USE_X_SENDFILE'))
+
+
+@dataclass(slots=True)
+class AppState:
+    """Selector state shared by the request handlers and the render thread."""
+    script_lines: list = field(default_factory=list)
+    video_transcriptions: dict = field(default_factory=dict)
+    matches_per_line: dict = field(default_factory=dict)
+    match_data: dict = field(default_factory=dict)  # {line_num: matches formatted for /api/line}
+    ngram_index: dict = field(default_factory=dict)  # {video_name: {(word, ...): [word positions]}}
+    selections: dict = field(default_factory=dict)
+    trim_data: dict = field(default_factory=dict)  # Store custom trim times {line_num: {start: float, end: float}}
+    processing: bool = False
+    progress: dict = field(default_factory=lambda: {'done': 0, 'total': 0})  # Segments extracted by the running render
+    name_to_path: dict = field(default_factory=dict)  # {video_name: video_path} of every loaded video
+    video_folder: Path | None = None
+    transcription_folder: Path | None = None
+    job_id: int = 0  # Bumped by every /api/generate
+    progress_version: int = 0  # Bumped by every report_progress
+
+
 # Global state
-current_state = {
-    'script_lines': [],
-    'video_transcriptions': {},
-    'matches_per_line': {},
-    'selections': {},
-    'trim_data': {},  # Store custom trim times {line_num: {start: float, end: float}}
-    'processing': False,
-    'video_folder': None,
-    'transcription_folder': None,
-}
-
-
-def clean_text(text: str) -> str:
-    """Clean and normalize text for matching."""
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.strip()
-
-
-def find_all_matches(script_line: str, video_transcriptions: dict, min_score: float = 0.5) -> list:
-    """Find ALL videos that contain the script line."""
+current_state = AppState()
+
+
+def ojson(obj, status: int = 200):
+    """JSON response through orjson when available; jsonify otherwise."""
+    if orjson is None:
+        return jsonify(obj), status
+    return app.response_class(orjson.dumps(obj), status=status, mimetype='application/json')
+
+
+# Guards current_state fields written by the render thread and read by requests
+state_lock = threading.Lock()
+
+# One render at a time; requests only submit to it and return
+EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+
+# Signalled on every progress change; shares state_lock
+progress_changed = threading.Condition(state_lock)
+
+# Latest (version, snapshot) pairs for /api/progress; each stream reads the
+# versions it hasn't sent yet, so every open page sees every update. When a
+# stream falls more than maxlen updates behind, the oldest are dropped.
+progress_events = deque(maxlen=64)
+
+
+PREFILTER_TOP_K = 32  # Candidate videos scored per line once the corpus is larger
+
+
+def build_token_index(cleaned_transcriptions: dict) -> dict:
+    """Inverted index {word: set of video names} over cleaned transcriptions."""
+    index = {}
+    for name, text in cleaned_transcriptions.items():
+        for word in set(text.split()):
+            index.setdefault(word, set()).add(name)
+    return index
+
+
+def candidate_videos(script_line_clean: str, token_index: dict, top_k: int = PREFILTER_TOP_K) -> list:
+    """
+    Videos worth scoring for a line: every video containing all of its known
+    words (retakes of the line, however many), plus the top_k others sharing
+    the most words. Each shared word counts 1/(videos containing it), so rare
+    words outweigh "the" and "and".
+    """
+    overlap = {}
+    shared = {}
+    known_words = 0
+    for word in set(script_line_clean.split()):
+        postings = token_index.get(word)
+        if not postings:
+            continue
+        known_words += 1
+        weight = 1.0 / len(postings)
+        for name in postings:
+            overlap[name] = overlap.get(name, 0.0) + weight
+            shared[name] = shared.get(name, 0) + 1
+    
+    complete = [name for name, count in shared.items() if count == known_words]
+    partial = [name for name, count in shared.items() if count < known_words]
+    return complete + heapq.nlargest(top_k, partial, key=overlap.get)
+
+
+def find_all_matches(
+    script_line: str,
+    video_transcriptions: dict,
+    min_score: float = 0.5,
+    cleaned_transcriptions: dict | None = None,
+    workers: int = -1,
+    token_index: dict | None = None,
+) -> list:
+    """
+    Find ALL videos that contain the script line.
+    cleaned_transcriptions (name -> clean_text(transcription)) is built once
+    in initialize() so transcriptions aren't re-cleaned for every line.
+    workers is RapidFuzz's thread count (-1: all cores).
+    With a token_index and more than PREFILTER_TOP_K videos, only the videos
+    from candidate_videos are scored; every take containing all of the
+    line's words is always among them.
+    The difflib fallback turns off autojunk: on transcriptions over 200
+    characters it treats every common letter as junk and underscores matches.
+    """
     matches = []
     script_line_clean = clean_text(script_line)
     
     if not script_line_clean:
         return matches
     
+    if token_index is not None and len(video_transcriptions) > PREFILTER_TOP_K:
+        video_transcriptions = {
+            name: video_transcriptions[name] for name in candidate_videos(script_line_clean, token_index)
+        }
+    
+    if cleaned_transcriptions is None:
+        cleaned_transcriptions = {vf: clean_text(t) for vf, t in video_transcriptions.items()}
+    
+    if process is not None and video_transcriptions:
+        # partial_ratio is the best substring alignment, so it covers both the
+        # containment check and the phrase-window search; cdist runs in C++
+        names = list(video_transcriptions)
+        trans_cleaned = [cleaned_transcriptions[name] for name in names]
+        scores = process.cdist(
+            [script_line_clean], trans_cleaned,
+            scorer=fuzz.partial_ratio, workers=workers, score_cutoff=min_score * 100,
+        )[0]
+        for video_file, trans_clean, score in zip(names, trans_cleaned, scores):
+            if script_line_clean in trans_clean:
+                matches.append((video_file, 1.0, video_transcriptions[video_file][:100]))
+            elif score:
+                matches.append((video_file, float(score) / 100.0, video_transcriptions[video_file][:100]))
+        
+        matches.sort(key=lambda x: x[1], reverse=True)
+        return matches
+    
     for video_file, transcription in video_transcriptions.items():
-        trans_clean = clean_text(transcription)
+        trans_clean = cleaned_transcriptions[video_file]
         
         # Check if line appears in transcription
         if script_line_clean in trans_clean:
@@ -52,7 +192,7 @@ def find_all_matches(script_line: str, video_transcriptions: dict, min_score: fl
             continue
         
         # Calculate similarity
-        score = SequenceMatcher(None, script_line_clean, trans_clean).ratio()
+        score = SequenceMatcher(None, script_line_clean, trans_clean, autojunk=False).ratio()
         
         # Check for partial phrase matches
         line_words = script_line_clean.split()
@@ -74,14 +214,24 @@ def find_all_matches(script_line: str, video_transcriptions: dict, min_score: fl
 
 
 def get_transcription_text(output_dir: str) -> str:
-    """Extract text from transcription output."""
+    """
+    Extract text from transcription output. Segment lists are streamed with
+    ijson when it is installed, so only the text fields are ever held.
+    """
     txt_file = Path(output_dir) / "out.txt"
     if txt_file.exists():
-        return txt_file.read_text()
+        return txt_file.read_bytes().decode('utf-8', errors='ignore')
     
     json_file = Path(output_dir) / "out.json"
     if json_file.exists():
-        data = json.loads(json_file.read_text())
+        if ijson is not None:
+            with json_file.open('rb') as f:
+                first = f.read(64).lstrip()[:1]
+                f.seek(0)
+                if first == b'[':
+                    return " ".join(ijson.items(f, 'item.text'))
+        
+        data = json.loads(json_file.read_bytes())
         if isinstance(data, dict) and "text" in data:
             return data["text"]
         elif isinstance(data, list):
@@ -90,8 +240,79 @@ def get_transcription_text(output_dir: str) -> str:
     return ""
 
 
-def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
-    """Find where a phrase appears in text."""
+_match_corpus = None  # (trans_dict, cleaned, workers, token_index) used by _match_one
+
+
+def _init_match_corpus(trans_dict: dict, cleaned: dict, workers: int, token_index: dict):
+    """Pool initializer: hand each worker the corpus once instead of per line."""
+    global _match_corpus
+    _match_corpus = (trans_dict, cleaned, workers, token_index)
+
+
+def _match_one(script_line: str) -> list:
+    """Match one script line against the corpus set by _init_match_corpus."""
+    trans_dict, cleaned, workers, token_index = _match_corpus
+    return find_all_matches(
+        script_line, trans_dict, min_score=0.5,
+        cleaned_transcriptions=cleaned, workers=workers, token_index=token_index,
+    )
+
+
+def match_all_lines(script_lines: list, trans_dict: dict, cleaned: dict) -> list:
+    """
+    Match every script line in parallel. RapidFuzz releases the GIL, so
+    threads scale; the pure-Python difflib fallback needs processes.
+    """
+    token_index = build_token_index(cleaned)
+    initargs = (trans_dict, cleaned, 1, token_index)  # One RapidFuzz thread per line
+    if process is not None or len(script_lines) < 16:
+        with ThreadPoolExecutor(initializer=_init_match_corpus, initargs=initargs) as executor:
+            return list(executor.map(_match_one, script_lines))
+    
+    # forkserver/spawn: never fork the Flask server's threads
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=_init_match_corpus,
+        initargs=initargs,
+    ) as executor:
+        return list(executor.map(_match_one, script_lines, chunksize=8))
+
+
+NGRAM_SIZES = (6, 5, 4, 3)
+
+
+def build_ngram_index(words: list) -> dict:
+    """Map every 3- to 6-word run of a transcription to all of its positions."""
+    index = {}
+    for n in NGRAM_SIZES:
+        for i in range(len(words) - n + 1):
+            index.setdefault(tuple(words[i:i + n]), []).append(i)
+    return index
+
+
+def best_window(text_words: list, phrase_words: list) -> tuple:
+    """
+    Vectorized word-window scan: (start, fraction of phrase words in place)
+    for the window of len(phrase_words) words that agrees with the phrase most.
+    """
+    vocab = {}
+    text_ids = np.array([vocab.setdefault(w, len(vocab)) for w in text_words], dtype=np.int32)
+    phrase_ids = np.array([vocab.setdefault(w, len(vocab)) for w in phrase_words], dtype=np.int32)
+    windows = np.lib.stride_tricks.sliding_window_view(text_ids, len(phrase_ids))
+    agreement = (windows == phrase_ids[None, :]).sum(axis=1)
+    best = int(agreement.argmax())
+    return best, agreement[best] / len(phrase_ids)
+
+
+def find_phrase_in_text(phrase: str, full_text: str, ngram_index: dict | None = None) -> tuple:
+    """
+    Find where a phrase appears in text.
+    ngram_index (from build_ngram_index) turns exact runs into candidate
+    windows; each is scored against the phrase and the best one wins, so a
+    flubbed first attempt loses to the full retake later in the take.
+    The difflib fallback runs with autojunk=False, as in find_all_matches.
+    """
     phrase_clean = clean_text(phrase)
     text_clean = clean_text(full_text)
     
@@ -101,12 +322,44 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     phrase_words = phrase_clean.split()
     text_words = text_clean.split()
     
+    if ngram_index:
+        # Every verbatim run of the phrase proposes where it starts
+        last_start = max(0, len(text_words) - len(phrase_words))
+        starts = set()
+        for n in NGRAM_SIZES:
+            for j in range(len(phrase_words) - n + 1):
+                for position in ngram_index.get(tuple(phrase_words[j:j + n]), ()):
+                    starts.add(min(max(0, position - j), last_start))
+        if starts:
+            scorer = fuzz.ratio if fuzz is not None else (
+                lambda a, b: SequenceMatcher(None, a, b, autojunk=False).ratio()
+            )
+            start = max(sorted(starts), key=lambda i: scorer(
+                phrase_clean, ' '.join(text_words[i:i + len(phrase_words)])
+            ))
+            return (start / len(text_words), min(start + len(phrase_words), len(text_words)) / len(text_words))
+    
+    if fuzz is not None:
+        # Best-aligned substring in one call, mapped from characters to words
+        alignment = fuzz.partial_ratio_alignment(phrase_clean, text_clean, score_cutoff=50)
+        if alignment is None:
+            return (0.0, 1.0)
+        start_word = text_clean.count(' ', 0, alignment.dest_start)
+        end_word = text_clean.count(' ', 0, alignment.dest_end) + 1
+        return (start_word / len(text_words), min(end_word, len(text_words)) / len(text_words))
+    
+    if np is not None and len(text_words) >= len(phrase_words):
+        best_start, best_score = best_window(text_words, phrase_words)
+        if best_score < 0.5:
+            return (0.0, 1.0)
+        return (best_start / len(text_words), (best_start + len(phrase_words)) / len(text_words))
+    
     best_start = 0
     best_score = 0.0
     
     for i in range(len(text_words) - len(phrase_words) + 1):
         window = ' '.join(text_words[i:i + len(phrase_words)])
-        score = SequenceMatcher(None, phrase_clean, window).ratio()
+        score = SequenceMatcher(None, phrase_clean, window, autojunk=False).ratio()
         if score > best_score:
             best_score = score
             best_start = i
@@ -121,10 +374,62 @@ def find_phrase_in_text(phrase: str, full_text: str) -> tuple:
     return (start_ratio, end_ratio)
 
 
-def get_video_duration(video_path: str) -> float:
-    """Get video duration in seconds."""
+def read_mp4_duration(video_path: str) -> float | None:
+    """
+    Read the duration from an MP4/MOV 'moov/mvhd' header directly, so the
+    common case never spawns ffprobe. Returns None for other containers
+    and for fragmented files whose mvhd carries no duration.
+    """
+    try:
+        with open(video_path, 'rb') as f:
+            offset = 0
+            parent_end = os.fstat(f.fileno()).st_size
+            while offset + 8 <= parent_end:
+                f.seek(offset)
+                size, box_type = struct.unpack('>I4s', f.read(8))
+                header = 8
+                if size == 1:  # 64-bit box size follows
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    header = 16
+                elif size == 0:  # Box runs to the end of its parent
+                    size = parent_end - offset
+                if size < header:
+                    return None
+                
+                if box_type == b'moov':
+                    # Descend: mvhd is a direct child of moov
+                    parent_end = offset + size
+                    offset += header
+                    continue
+                if box_type == b'mvhd':
+                    version = f.read(4)[0]  # Version byte + 3 flag bytes
+                    if version == 1:
+                        f.seek(16, os.SEEK_CUR)  # 64-bit creation/modification times
+                        timescale, duration = struct.unpack('>IQ', f.read(12))
+                        unknown = 2**64 - 1
+                    else:
+                        f.seek(8, os.SEEK_CUR)
+                        timescale, duration = struct.unpack('>II', f.read(8))
+                        unknown = 0xFFFFFFFF
+                    # Fragmented MP4s leave mvhd empty; ffprobe has to sum the fragments
+                    if not timescale or duration in (0, unknown):
+                        return None
+                    return duration / timescale
+                offset += size
+    except (OSError, struct.error, IndexError):
+        return None
+    return None
+
+
+@lru_cache(maxsize=None)
+def _probe_duration(video_path: str, mtime_ns: int, size: int) -> float:
+    """Container duration; mtime/size are part of the cache key."""
+    duration = read_mp4_duration(video_path)
+    if duration is not None:
+        return duration
+    
     cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-           '-of', 'default=noprint_wrappers=1:nokey=1', str(video_path)]
+           '-of', 'default=noprint_wrappers=1:nokey=1', video_path]
     result = subprocess.run(cmd, capture_output=True, text=True)
     try:
         return float(result.stdout.strip())
@@ -132,86 +437,267 @@ def get_video_duration(video_path: str) -> float:
         return 0.0
 
 
-def extract_video_segment(video_path: str, start_time: float, end_time: float, output_path: str):
-    """Extract a segment from video with audio normalization."""
+def get_video_duration(video_path: str) -> float:
+    """Get video duration in seconds, probing each file version only once."""
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return 0.0
+    return _probe_duration(str(video_path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=None)
+def keyframe_times(video_path: str) -> tuple:
+    """Presentation times of the keyframes of the first video stream."""
+    # pkt_pts_time is gone from ffprobe 5+, pts_time is the same value
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+         '-show_frames', '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', str(video_path)],
+        capture_output=True, text=True
+    )
+    times = []
+    for line in result.stdout.split():
+        try:
+            times.append(float(line.strip(',')))
+        except ValueError:
+            continue
+    return tuple(sorted(times))
+
+
+def snap_to_keyframe(video_path: str, time: float) -> float:
+    """Latest keyframe at or before time (time itself if none are known)."""
+    keyframes = keyframe_times(str(video_path))
+    k = bisect.bisect_right(keyframes, time + 1e-3)
+    return keyframes[k - 1] if k else time
+
+
+@lru_cache(maxsize=None)
+def probe_video_params(video_path: str) -> str:
+    """Codec, profile, size, pixel format and frame rate of the first video stream."""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=codec_name,profile,width,height,pix_fmt,r_frame_rate',
+         '-of', 'csv=p=0', str(video_path)],
+        capture_output=True, text=True
+    )
+    return result.stdout.strip()
+
+
+@lru_cache(maxsize=None)
+def probe_video_size(video_path: str) -> tuple:
+    """(width, height) of the first video stream, rounded down to even for yuv420p."""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=width,height', '-of', 'csv=s=x:p=0', str(video_path)],
+        capture_output=True, text=True, check=True
+    )
+    width, height = result.stdout.strip().split('x')[:2]
+    return int(width) // 2 * 2, int(height) // 2 * 2
+
+
+def fit_frame_filter(frame_size: tuple) -> str:
+    """Scale and pad any input into frame_size with square pixels."""
+    width, height = frame_size
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+
+
+def sources_share_params(video_paths) -> bool:
+    """True if every video stream can be concatenated without re-encoding."""
+    params = {probe_video_params(str(path)) for path in video_paths}
+    return len(params) == 1 and '' not in params
+
+
+def extract_video_segment(video_path: str, start_time: float, end_time: float, output_path: str,
+                          copy_video: bool = False, frame_size: tuple | None = None):
+    """
+    Extract a segment from video. Loudness normalization happens once on the
+    joined audio in concatenate_videos, so segments only get a uniform AAC track.
+    copy_video cuts the video stream without re-encoding: start_time is pulled
+    back to the preceding keyframe, and every segment of the render must come
+    from sources that share their video parameters.
+    Otherwise every segment is scaled and padded to frame_size and gets the
+    same frame rate, timescale and format, so concatenate_videos can still
+    join them without re-encoding.
+    """
+    if copy_video:
+        start_time = snap_to_keyframe(video_path, start_time)
     duration = end_time - start_time
     
-    # Use loudnorm filter to normalize audio levels to -16 LUFS (standard for video)
+    if copy_video:
+        encoder_args = ['-c:v', 'copy']
+    else:
+        encoder_args = video_encoder_args('ultrafast')
+        if frame_size:
+            encoder_args += ['-vf', fit_frame_filter(frame_size)]  # Same SPS for every segment
+        encoder_args += [
+            '-r', '24', '-vsync', 'cfr',  # Constant 24fps (critical for sync)
+            '-pix_fmt', 'yuv420p',
+        ]
+    
     cmd = [
         'ffmpeg', '-ss', str(start_time), '-i', str(video_path), '-t', str(duration),
-        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '23',
-        '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Audio normalization
+        *encoder_args,
+        '-video_track_timescale', '90000',  # Shared timescale for stream-copy concat
         '-c:a', 'aac', '-b:a', '192k', '-ar', '48000',
-        '-movflags', '+faststart', '-pix_fmt', 'yuv420p', '-y', str(output_path)
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart', '-y', str(output_path)
     ]
     
     subprocess.run(cmd, capture_output=True, check=True)
 
 
 def concatenate_videos(video_paths: list, output_path: str):
-    """Concatenate multiple videos with proper sync (optimized for speed)."""
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-        for video_path in video_paths:
-            f.write(f"file '{Path(video_path).absolute()}'\n")
-        list_file = f.name
+    """
+    Concatenate segments from extract_video_segment. Video is stream-copied;
+    only the audio is re-encoded, to loudness-normalize the whole cut at once.
+    On Linux the file list lives in a memfd handed to ffmpeg, so nothing is
+    written to disk for it.
+    """
+    listing = ''.join(f"file '{Path(video_path).absolute()}'\n" for video_path in video_paths)
+    
+    pass_fds = ()
+    list_file = None
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('concat_list')
+        os.write(fd, listing.encode())
+        pass_fds = (fd,)
+        list_arg = f"/proc/self/fd/{fd}"
+    else:
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+            f.write(listing)
+            list_file = f.name
+        list_arg = list_file
     
     try:
-        # Re-encode to fix sync issues - ensures constant framerate and timestamps
+        # Segments already share codec, frame size, frame rate and timescale
         cmd = [
             'ffmpeg',
             '-f', 'concat',
             '-safe', '0',
-            '-i', list_file,
-            # Video encoding with constant framerate (fast preset for speed)
-            '-c:v', 'libx264',
-            '-preset', 'veryfast',
-            '-crf', '23',
-            '-r', '24',  # Force constant 24fps
-            '-vsync', 'cfr',  # Constant frame rate (critical for sync)
-            # Audio normalization and encoding
-            '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Normalize overall audio
+            '-i', list_arg,
+            '-c:v', 'copy',
+            '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',  # Audio normalization
             '-c:a', 'aac',
             '-b:a', '192k',
-            '-ar', '48000',  # Consistent sample rate
-            '-async', '1',  # Audio sync correction
-            # Output settings
+            '-ar', '48000',
             '-movflags', '+faststart',
-            '-pix_fmt', 'yuv420p',
             '-y',
             str(output_path)
         ]
-        subprocess.run(cmd, capture_output=True, check=True)
+        subprocess.run(cmd, capture_output=True, check=True, pass_fds=pass_fds)
     finally:
-        Path(list_file).unlink()
+        for fd in pass_fds:
+            os.close(fd)
+        if list_file:
+            Path(list_file).unlink()
+
+
+def drop_page_cache(paths):
+    """Tell the kernel the cached pages of finished files can go (no-op off POSIX)."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
 
 
-def generate_final_video():
-    """Generate the final video based on user selections."""
-    current_state['processing'] = True
+def render_selection(segments: list, output_path: str):
+    """
+    Cut and join (video_path, start_time, end_time) segments in a single
+    ffmpeg run with the concat filter: no temp files are written or re-read,
+    but every frame goes through the filter graph.
+    """
+    encoder_args = video_encoder_args('veryfast')
+    # The concat filter needs one frame size; use the first take's
+    fit = fit_frame_filter(probe_video_size(str(segments[0][0]))) if segments else 'null'
+    cmd = ['ffmpeg']
+    filters = []
+    labels = []
+    for k, (video_path, start_time, end_time) in enumerate(segments):
+        cmd += ['-ss', str(start_time), '-t', str(end_time - start_time), '-i', str(video_path)]
+        filters.append(f"[{k}:v:0]{fit},setpts=PTS-STARTPTS[v{k}];[{k}:a:0]asetpts=PTS-STARTPTS[a{k}]")
+        labels.append(f"[v{k}][a{k}]")
+    filters.append(f"{''.join(labels)}concat=n={len(segments)}:v=1:a=1[vcat][acat]")
+    filters.append("[acat]loudnorm=I=-16:TP=-1.5:LRA=11[aout]")  # Audio normalization
     
+    cmd += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[vcat]',
+        '-map', '[aout]',
+        *encoder_args,
+        '-r', '24',  # Force constant 24fps
+        '-vsync', 'cfr',
+        '-c:a', 'aac',
+        '-b:a', '192k',
+        '-ar', '48000',
+        '-movflags', '+faststart',
+        '-pix_fmt', 'yuv420p',
+        '-y',
+        str(output_path)
+    ]
+    subprocess.run(cmd, capture_output=True, check=True)
+
+
+def _progress_snapshot() -> dict:
+    """Current render progress; call with state_lock held."""
+    return {
+        'processing': current_state.processing,
+        'job_id': current_state.job_id,
+        **current_state.progress,
+    }
+
+
+def report_progress(done: int | None = None, total: int | None = None):
+    """Update the render progress and wake the /api/progress streams."""
+    with progress_changed:
+        if total is not None:
+            current_state.progress = {'done': 0, 'total': total}
+        if done is not None:
+            current_state.progress['done'] = done
+        current_state.progress_version += 1
+        progress_events.append((current_state.progress_version, _progress_snapshot()))
+        progress_changed.notify_all()
+
+
+def generate_final_video(single_pass: bool = False, stream_copy: bool = False):
+    """
+    Generate the final video based on user selections.
+    single_pass renders through one filter_complex instead of extracting
+    segments to disk and concatenating them; worth it on slow disks.
+    stream_copy cuts the video at keyframes without re-encoding when all
+    sources share their video parameters. Each cut then starts at the
+    keyframe before its start time, even a user-set one, so it is opt-in.
+    Runs on EXECUTOR; /api/generate has already set the processing flag.
+    """
+    success = False
     try:
         temp_path = Path("temp_segments_ui")
-        temp_path.mkdir(exist_ok=True)
+        output_path = "final_script_video_ui.mp4"
         
-        segment_paths = []
-        selections = sorted(current_state['selections'].items(), key=lambda x: int(x[0]))
+        tasks = []  # (video_file, start_time, end_time, segment_path) in script order
+        selections = sorted(current_state.selections.items(), key=lambda x: int(x[0]))
         
         for line_num_str, video_name in selections:
             line_num = int(line_num_str)
-            script_line = current_state['script_lines'][line_num - 1]
+            script_line = current_state.script_lines[line_num - 1]
             
             # Find the video file
-            video_file = None
-            for vf in current_state['video_transcriptions'].keys():
-                if vf.name == video_name:
-                    video_file = vf
-                    break
+            video_file = current_state.name_to_path.get(video_name)
             
             if not video_file:
                 continue
             
             # Check if user has custom trim times
-            trim_info = current_state['trim_data'].get(line_num_str)
+            trim_info = current_state.trim_data.get(line_num_str)
             
             if trim_info and 'start' in trim_info and 'end' in trim_info:
                 # Use custom trim times from user
@@ -219,31 +705,82 @@ def generate_final_video():
                 end_time = trim_info['end']
             else:
                 # Auto-detect timing from transcription
-                trans_text = current_state['video_transcriptions'][video_file]
-                start_ratio, end_ratio = find_phrase_in_text(script_line, trans_text)
+                trans_text = current_state.video_transcriptions[video_file]
+                start_ratio, end_ratio = find_phrase_in_text(
+                    script_line, trans_text, current_state.ngram_index.get(video_name)
+                )
                 video_duration = get_video_duration(video_file)
                 start_time = max(0, start_ratio * video_duration - 0.1)
                 end_time = min(video_duration, end_ratio * video_duration + 0.1)
             
-            # Extract segment
             segment_path = temp_path / f"segment_{line_num:03d}.mp4"
-            extract_video_segment(video_file, start_time, end_time, segment_path)
-            segment_paths.append(segment_path)
+            tasks.append((video_file, start_time, end_time, segment_path))
+        
+        if single_pass:
+            report_progress(total=len(tasks))
+            render_selection([task[:3] for task in tasks], output_path)
+            report_progress(done=len(tasks))
+            success = True
+            return True
+        
+        temp_path.mkdir(exist_ok=True)
+        
+        # When all sources share their video parameters the segments can be
+        # cut at keyframes with a stream copy instead of being re-encoded
+        copy_video = stream_copy and sources_share_params({task[0] for task in tasks})
+        # Re-encoded segments all take the first selected take's frame size
+        frame_size = probe_video_size(str(tasks[0][0])) if tasks and not copy_video else None
+        
+        # Extract segments concurrently; libx264 is already multi-threaded,
+        # so half the cores is enough to keep the machine busy
+        max_workers = min(len(tasks), max(1, (os.cpu_count() or 2) // 2)) or 1
+        report_progress(total=len(tasks))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(extract_video_segment, *task, copy_video, frame_size) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                report_progress(done=done)
+        segment_paths = [task[3] for task in tasks]
         
         # Concatenate
-        output_path = "final_script_video_ui.mp4"
         concatenate_videos(segment_paths, output_path)
         
-        # Cleanup
+        # Cleanup: evict the segments from the page cache before deleting them
+        drop_page_cache(segment_paths)
         shutil.rmtree(temp_path)
         
-        current_state['processing'] = False
+        success = True
         return True
     
     except Exception as e:
         print(f"Error: {e}")
-        current_state['processing'] = False
         return False
+    
+    finally:
+        with state_lock:
+            current_state.processing = False
+            current_state.progress['success'] = success
+        report_progress()
+
+
+MATCH_CACHE_DIR = Path(".cache")
+MATCH_CACHE_VERSION = 3  # Bump when clean_text or scoring changes what a match looks like
+
+
+def matches_cache_key(script_bytes: bytes, transcription_folder: Path, video_paths) -> str:
+    """
+    Key for cached matches: the script text, every transcription file's
+    mtime, the videos they resolved to, and the scoring backend.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{MATCH_CACHE_VERSION}|".encode())
+    h.update(script_bytes)
+    for trans_file in sorted(transcription_folder.rglob('out.*')):
+        h.update(f"|{trans_file}:{trans_file.stat().st_mtime_ns}".encode())
+    for video_path in sorted(str(p) for p in video_paths):
+        h.update(f"|{video_path}".encode())
+    h.update(b'|rapidfuzz' if process is not None else b'|difflib')  # Scores differ per backend
+    return h.hexdigest()
 
 
 @app.route('/')
@@ -258,15 +795,16 @@ def initialize():
     
     # Read master script
     script_path = Path("master_script.txt")
-    master_script = script_path.read_text()
-    current_state['script_lines'] = [line.strip() for line in master_script.split('\n') if line.strip()]
+    script_bytes = script_path.read_bytes()
+    master_script = script_bytes.decode('utf-8')
+    current_state.script_lines = [line.strip() for line in master_script.split('\n') if line.strip()]
     
     # Load transcriptions
     transcription_folder = Path("transcriptions")
     video_folder = Path("totranscribe")
     
-    current_state['video_folder'] = video_folder
-    current_state['transcription_folder'] = transcription_folder
+    current_state.video_folder = video_folder
+    current_state.transcription_folder = transcription_folder
     
     video_transcriptions = {}
     
@@ -281,58 +819,91 @@ def initialize():
                         video_transcriptions[video_path] = trans_text
                         break
     
-    current_state['video_transcriptions'] = video_transcriptions
+    current_state.video_transcriptions = video_transcriptions
+    current_state.name_to_path = {vf.name: vf for vf in video_transcriptions}
+    
+    # Transcriptions never change after loading, so clean them once
+    trans_dict = {vf.name: trans for vf, trans in video_transcriptions.items()}
+    cleaned = {name: clean_text(trans) for name, trans in trans_dict.items()}
+    current_state.ngram_index = {name: build_ngram_index(text.split()) for name, text in cleaned.items()}
+    
+    # Reuse matches from an earlier run when nothing they depend on changed
+    cache_file = MATCH_CACHE_DIR / f"matches_{matches_cache_key(script_bytes, transcription_folder, video_transcriptions)}.pkl"
+    matches_per_line = None
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'rb') as f:
+                matches_per_line = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            matches_per_line = None
     
-    # Find matches for each line
-    matches_per_line = {}
-    for line_num, script_line in enumerate(current_state['script_lines'], 1):
-        trans_dict = {vf.name: trans for vf, trans in video_transcriptions.items()}
-        matches = find_all_matches(script_line, trans_dict, min_score=0.5)
-        matches_per_line[line_num] = matches
+    if matches_per_line is None:
+        # Find matches for each line
+        all_matches = match_all_lines(current_state.script_lines, trans_dict, cleaned)
+        matches_per_line = {line_num: matches for line_num, matches in enumerate(all_matches, 1)}
+        
+        MATCH_CACHE_DIR.mkdir(exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(matches_per_line, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)  # Atomic: a crashed write never leaves a bad cache
+    
+    current_state.matches_per_line = matches_per_line
     
-    current_state['matches_per_line'] = matches_per_line
+    # Format matches for frontend once instead of on every /api/line request
+    current_state.match_data = {
+        line_num: [
+            {
+                'video_name': video_name,
+                'score': score,
+                'preview': preview,
+                'video_url': f'/video/{video_name}'
+            }
+            for video_name, score, preview in matches
+        ]
+        for line_num, matches in matches_per_line.items()
+    }
     
     return jsonify({
         'success': True,
-        'total_lines': len(current_state['script_lines'])
+        'total_lines': len(current_state.script_lines)
     })
 
 
 @app.route('/api/line/<int:line_num>')
 def get_line_data(line_num):
     """Get data for a specific line."""
-    if line_num < 1 or line_num > len(current_state['script_lines']):
-        return jsonify({'error': 'Invalid line number'}), 400
-    
-    script_line = current_state['script_lines'][line_num - 1]
-    matches = current_state['matches_per_line'].get(line_num, [])
-    
-    # Format matches for frontend
-    match_data = []
-    for video_name, score, preview in matches:
-        # Get video path relative to web server
-        match_data.append({
-            'video_name': video_name,
-            'score': score,
-            'preview': preview,
-            'video_url': f'/video/{video_name}'
-        })
+    if line_num < 1 or line_num > len(current_state.script_lines):
+        return ojson({'error': 'Invalid line number'}, 400)
     
-    return jsonify({
+    return ojson({
         'line_number': line_num,
-        'script_line': script_line,
-        'matches': match_data,
-        'total_lines': len(current_state['script_lines']),
-        'current_selection': current_state['selections'].get(str(line_num))
+        'script_line': current_state.script_lines[line_num - 1],
+        'matches': current_state.match_data.get(line_num, []),
+        'total_lines': len(current_state.script_lines),
+        'current_selection': current_state.selections.get(str(line_num))
     })
 
 
 @app.route('/video/<path:video_name>')
 def serve_video(video_name):
-    """Serve a video file."""
-    video_path = current_state['video_folder'] / video_name
-    if video_path.exists():
-        return send_file(video_path, mimetype='video/mp4')
+    """
+    Serve a video file. conditional=True answers Range requests with 206
+    partial content, so the player can seek without re-downloading, and
+    If-None-Match with 304 against an ETag from the file's mtime and size.
+    Only videos loaded by initialize() are served, so a crafted name can't
+    reach files outside the video folder.
+    """
+    video_path = current_state.name_to_path.get(video_name)
+    if video_path and video_path.exists():
+        stat = video_path.stat()
+        return send_file(
+            video_path,
+            mimetype='video/mp4',
+            conditional=True,
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            max_age=3600,
+        )
     return "Video not found", 404
 
 
@@ -344,38 +915,85 @@ def select_take():
     video_name = data.get('video_name')
     trim = data.get('trim')  # {start: float, end: float}
     
-    current_state['selections'][line_num] = video_name
+    current_state.selections[line_num] = video_name
     
     # Store trim data if provided
     if trim:
-        current_state['trim_data'][line_num] = trim
+        current_state.trim_data[line_num] = trim
     
     return jsonify({
         'success': True,
-        'selections_count': len(current_state['selections'])
+        'selections_count': len(current_state.selections)
     })
 
 
 @app.route('/api/generate', methods=['POST'])
 def generate_video():
-    """Generate the final video."""
-    if current_state['processing']:
-        return jsonify({'error': 'Already processing'}), 400
+    """Queue generation of the final video."""
+    options = request.get_json(silent=True) or {}
+    
+    # Check and set under the lock so two requests can't both start a render
+    with state_lock:
+        if current_state.processing:
+            return jsonify({'error': 'Already processing'}), 400
+        current_state.processing = True
+        current_state.progress = {'done': 0, 'total': 0}
+        current_state.job_id += 1
+        job_id = current_state.job_id
     
-    # Run in background thread
-    thread = threading.Thread(target=generate_final_video)
-    thread.start()
+    EXECUTOR.submit(
+        generate_final_video, bool(options.get('single_pass')), bool(options.get('stream_copy'))
+    )
     
-    return jsonify({'success': True, 'message': 'Video generation started'})
+    return jsonify({'success': True, 'job_id': job_id, 'message': 'Video generation started'})
+
+
+@app.route('/api/progress')
+def progress_stream():
+    """Server-sent events with render progress until the current render ends."""
+    def events():
+        with state_lock:
+            version = current_state.progress_version
+            snapshot = _progress_snapshot()
+        yield f"data: {json.dumps(snapshot)}\n\n"
+        
+        while snapshot['processing']:
+            with progress_changed:
+                progress_changed.wait_for(lambda: current_state.progress_version != version, timeout=15)
+                pending = [event for event_version, event in progress_events if event_version > version]
+                version = current_state.progress_version
+                if not pending:
+                    # Timed out: re-read the state instead of trusting the last event
+                    snapshot = _progress_snapshot()
+            
+            if not pending:
+                if not snapshot['processing']:
+                    yield f"data: {json.dumps(snapshot)}\n\n"
+                    break
+                yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                continue
+            
+            for snapshot in pending:
+                yield f"data: {json.dumps(snapshot)}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/api/status')
 def get_status():
     """Get current status."""
-    return jsonify({
-        'processing': current_state['processing'],
-        'selections': current_state['selections'],
-        'total_lines': len(current_state['script_lines'])
+    with state_lock:
+        processing = current_state.processing
+        progress = dict(current_state.progress)
+    return ojson({
+        'processing': processing,
+        'progress': progress,
+        'selections': current_state.selections,
+        'total_lines': len(current_state.script_lines)
     })
 
 
@@ -390,10 +1008,10 @@ def save_session():
         
         session_data = {
             'timestamp': timestamp,
-            'selections': current_state['selections'],
-            'trim_data': current_state['trim_data'],
-            'total_lines': len(current_state['script_lines']),
-            'selected_count': len(current_state['selections'])
+            'selections': current_state.selections,
+            'trim_data': current_state.trim_data,
+            'total_lines': len(current_state.script_lines),
+            'selected_count': len(current_state.selections)
         }
         
         with open(filename, 'w') as f:
@@ -412,5 +1030,7 @@ if __name__ == '__main__':
     print("\n🎬 Starting Video Selector UI...")
     print("📱 Open your browser to: http://localhost:5000")
     print("Press Ctrl+C to stop\n")
-    app.run(debug=True, port=5000)
+    # Debugger and reloader only with FLASK_DEV=1: a reload drops the loaded
+    # state and forces initialize() to run again. ./start_ui.sh uses gunicorn.
+    app.run(debug=bool(os.environ.get('FLASK_DEV')), port=5000, threaded=True)
 
@@ -0,0 +1,356 @@
+"""
+Helpers shared by the splicers: text cleanup, ffmpeg encoder selection,
+durations, loudness normalization and segment rendering.
+"""
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import av  # PyAV: reads container headers in-process
+except ImportError:
+    av = None
+
+
+def _probe_encoders() -> frozenset:
+    """Return the names of all encoders the local ffmpeg build supports."""
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+    except OSError:
+        return frozenset()
+    
+    names = set()
+    for line in result.stdout.splitlines():
+        # Encoder rows look like: " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def encoder_works(encoder: str) -> bool:
+    """
+    Encode one blank frame with encoder. `ffmpeg -encoders` lists what the
+    build was compiled with, so stock Linux/Windows builds list h264_nvenc
+    and h264_qsv on machines without the hardware; only a real encode tells.
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'nullsrc=s=256x256',
+        '-frames:v', '1', '-pix_fmt', 'yuv420p', '-c:v', encoder,
+        '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def pick_video_encoder(available: frozenset) -> str:
+    """First hardware H.264 encoder that can actually encode here, else libx264."""
+    candidates = ['h264_nvenc', 'h264_qsv']
+    if platform.system() == 'Darwin':
+        candidates.insert(0, 'h264_videotoolbox')
+    for encoder in candidates:
+        if encoder in available and encoder_works(encoder):
+            return encoder
+    return 'libx264'
+
+
+# Probed once at import: Apple media engine, NVIDIA NVENC, Intel Quick Sync,
+# then CPU libx264
+AVAILABLE_ENCODERS = _probe_encoders()
+VIDEO_ENCODER = pick_video_encoder(AVAILABLE_ENCODERS)
+
+
+def video_encoder_args(preset: str = 'veryfast') -> list:
+    """ffmpeg video encoding args for VIDEO_ENCODER at roughly CRF 23 quality."""
+    if VIDEO_ENCODER == 'h264_videotoolbox':
+        return ['-c:v', 'h264_videotoolbox', '-b:v', '8M']
+    if VIDEO_ENCODER == 'h264_nvenc':
+        return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '23']
+    if VIDEO_ENCODER == 'h264_qsv':
+        return ['-c:v', 'h264_qsv', '-global_quality', '23']
+    return ['-c:v', 'libx264', '-preset', preset, '-crf', '23']  # preset only applies to libx264
+
+
+class _CleanTable(dict):
+    """
+    str.translate table that keeps word characters and whitespace and drops
+    everything else (same set as the regex [^\\w\\s]). Entries are filled in
+    the first time each code point is seen.
+    """
+    
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        self[codepoint] = codepoint if (char.isalnum() or char == '_' or char.isspace()) else None
+        return self[codepoint]
+
+
+_CLEAN_TABLE = _CleanTable()
+
+
+@lru_cache(maxsize=8192)
+def clean_text(text: str) -> str:
+    """Clean and normalize text for matching."""
+    # Lowercase, drop punctuation in one C-level pass, then collapse whitespace
+    return ' '.join(text.lower().translate(_CLEAN_TABLE).split())
+
+
+def get_video_duration(video_path: str) -> float:
+    """Get video duration in seconds (PyAV when installed, else ffprobe)."""
+    if av is not None:
+        try:
+            with av.open(str(video_path)) as container:
+                if container.duration is not None:
+                    return float(container.duration) / av.time_base
+        except Exception:
+            pass  # Container PyAV can't read, fall back to ffprobe below
+    
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        str(video_path)
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    duration_str = result.stdout.strip()
+    
+    if not duration_str:
+        # Fallback: try getting duration from stream info
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            str(video_path)
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        duration_str = result.stdout.strip()
+    
+    try:
+        return float(duration_str)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def run_ffmpeg(cmd: list):
+    """
+    Run an ffmpeg command once with -loglevel error, so stderr only carries
+    errors; a raised CalledProcessError has them in .stderr.
+    """
+    cmd = [cmd[0], '-hide_banner', '-loglevel', 'error', *cmd[1:]]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+
+
+def ffmpeg_error(error: subprocess.CalledProcessError) -> str:
+    """Last line ffmpeg wrote to stderr, for one-line failure messages."""
+    lines = (error.stderr or '').strip().splitlines()
+    return lines[-1] if lines else f"exit status {error.returncode}"
+
+
+LOUDNORM = 'loudnorm=I=-16:TP=-1.5:LRA=11'  # -16 LUFS, standard for video
+
+
+def measured_loudnorm(input_args: list, audio_graph: str) -> str:
+    """
+    First loudnorm pass: decode only the joined audio (audio_graph must output
+    [apre]) and return a second-pass loudnorm filter tuned to what it measured.
+    Falls back to single-pass loudnorm if the measurement can't be read.
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', *input_args,
+        '-filter_complex', f"{audio_graph};[apre]{LOUDNORM}:print_format=json[aout]",
+        '-map', '[aout]', '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        stats = json.loads(result.stderr[result.stderr.rindex('{'):result.stderr.rindex('}') + 1])
+        measured = {key: float(stats[key]) for key in ('input_i', 'input_tp', 'input_lra', 'input_thresh', 'target_offset')}
+    except (ValueError, KeyError):
+        return LOUDNORM
+    if not all(math.isfinite(value) for value in measured.values()):
+        return LOUDNORM  # Silent audio measures -inf
+    
+    return (
+        f"{LOUDNORM}:measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}:linear=true"
+    )
+
+
+def extract_video_segment(video_path: str, start_time: float, end_time: float, output_path: str):
+    """Extract a segment from video; loudness is normalized once at concat."""
+    duration = end_time - start_time
+    
+    cmd = [
+        'ffmpeg',
+        '-ss', str(start_time),  # Seek before input for faster processing
+        '-i', str(video_path),
+        '-t', str(duration),
+        # Re-encode with fast settings for speed
+        *video_encoder_args('ultrafast'),  # H.264, hardware encoder when available
+        '-c:a', 'aac',  # AAC audio codec
+        '-b:a', '192k',  # Audio bitrate
+        '-ar', '48000',  # Audio sample rate
+        '-movflags', '+faststart',  # Optimize for streaming
+        '-pix_fmt', 'yuv420p',  # Ensure compatibility
+        '-y',
+        str(output_path)
+    ]
+    
+    run_ffmpeg(cmd)
+
+
+def concatenate_videos(video_paths: list, output_path: str):
+    """Concatenate multiple videos with perfect audio/video sync (optimized for speed)."""
+    # Create a temporary file list for ffmpeg
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        for video_path in video_paths:
+            f.write(f"file '{Path(video_path).absolute()}'\n")
+        list_file = f.name
+    
+    try:
+        # Two-pass loudnorm: measure the joined audio first
+        loudnorm = measured_loudnorm(['-f', 'concat', '-safe', '0', '-i', list_file], "[0:a:0]anull[apre]")
+        
+        # Re-encode to prevent audio drift and sync issues
+        cmd = [
+            'ffmpeg',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_file,
+            # Video encoding with constant framerate (fast preset)
+            *video_encoder_args('veryfast'),
+            '-r', '24',  # Force constant 24fps
+            '-vsync', 'cfr',  # Constant frame rate (fixes drift)
+            # Audio normalization and encoding
+            '-af', loudnorm,  # Normalize overall audio
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-ar', '48000',  # Consistent sample rate
+            '-async', '1',  # Audio sync correction
+            # Output settings
+            '-movflags', '+faststart',
+            '-pix_fmt', 'yuv420p',
+            '-y',
+            str(output_path)
+        ]
+        run_ffmpeg(cmd)
+    finally:
+        Path(list_file).unlink()
+
+
+def render_selection(segments: list, output_path: str):
+    """
+    Cut and join (video_path, start_time, end_time) segments in one ffmpeg run.
+    Every input is seeked on open and the concat filter joins them, so the
+    video is encoded once and no temp segment files are written.
+    """
+    input_args = []
+    video_filters = []
+    audio_filters = []
+    for k, (video_path, start_time, end_time) in enumerate(segments):
+        input_args += ['-ss', str(start_time), '-t', str(end_time - start_time), '-i', str(video_path)]
+        video_filters.append(f"[{k}:v:0]setpts=PTS-STARTPTS[v{k}]")
+        audio_filters.append(f"[{k}:a:0]asetpts=PTS-STARTPTS[a{k}]")
+    n = len(segments)
+    
+    # Two-pass loudnorm: the audio-only first pass is cheap next to the video encode
+    audio_graph = ';'.join(audio_filters) + ';' + ''.join(f"[a{k}]" for k in range(n)) + f"concat=n={n}:v=0:a=1[apre]"
+    loudnorm = measured_loudnorm(input_args, audio_graph)
+    
+    filters = video_filters + audio_filters
+    filters.append(''.join(f"[v{k}][a{k}]" for k in range(n)) + f"concat=n={n}:v=1:a=1[vcat][acat]")
+    filters.append(f"[acat]{loudnorm}[aout]")  # Normalize overall audio
+    
+    cmd = [
+        'ffmpeg',
+        *input_args,
+        '-filter_complex', ';'.join(filters),
+        '-map', '[vcat]',
+        '-map', '[aout]',
+        *video_encoder_args('veryfast'),
+        '-r', '24',  # Force constant 24fps
+        '-vsync', 'cfr',
+        '-c:a', 'aac',
+        '-b:a', '192k',
+        '-ar', '48000',
+        '-movflags', '+faststart',
+        '-pix_fmt', 'yuv420p',
+        '-y',
+        str(output_path)
+    ]
+    run_ffmpeg(cmd)
+
+
+def discard_folder(folder: Path):
+    """
+    Rename a temp folder aside (atomic) and delete it on a background thread,
+    so the caller doesn't wait on one unlink per segment file.
+    """
+    trash = folder.with_name(f"{folder.name}.trash.{os.getpid()}.{time.monotonic_ns()}")
+    try:
+        folder.rename(trash)
+    except OSError:
+        shutil.rmtree(folder, ignore_errors=True)
+        return
+    # Non-daemon: the interpreter finishes the delete before exiting
+    threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={'ignore_errors': True}).start()
+
+
+def reap_stale_trash(temp_folder: str):
+    """Delete trash folders left behind by runs that were killed mid-cleanup."""
+    temp_path = Path(temp_folder)
+    for stale in temp_path.parent.glob(f"{temp_path.name}.trash.*"):
+        threading.Thread(target=shutil.rmtree, args=(stale,), kwargs={'ignore_errors': True}).start()
+
+
+def render_via_segments(segments: list, output_path: str, temp_folder: str, max_workers: int) -> int:
+    """
+    Fallback for render_selection: extract each segment to temp_folder in
+    parallel, then concatenate them. Returns how many segments were joined.
+    """
+    temp_path = Path(temp_folder)
+    temp_path.mkdir(exist_ok=True)
+    segment_paths = []
+    
+    try:
+        # Each ffmpeg encode runs in its own process, so threads are enough
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for i, (video_path, start_time, end_time) in enumerate(segments, 1):
+                segment_path = temp_path / f"segment_{i:03d}.mp4"
+                futures.append((segment_path, executor.submit(
+                    extract_video_segment, video_path, start_time, end_time, segment_path)))
+            
+            # Keep script order; a failed segment is left out of the cut
+            for i, (segment_path, future) in enumerate(futures, 1):
+                try:
+                    future.result()
+                    segment_paths.append(segment_path)
+                except Exception as e:
+                    print(f"   ❌ Error extracting segment {i:02d}: {e}")
+        
+        if segment_paths:
+            concatenate_videos(segment_paths, output_path)
+    finally:
+        discard_folder(temp_path)
+    
+    return len(segment_paths)